@@ -0,0 +1,10 @@
+"""
+Benchmarks for fmcardgen. These aren't part of the package or the test suite;
+run them from the repository root:
+
+    python -m benchmarks            # throughput, per stage, over a synthetic corpus
+    python -m benchmarks.wrap       # text wrapping, with and without its cache
+    python -m benchmarks.encode     # encode time and size for each output format
+    python -m benchmarks.startup    # start-up time, and what's imported
+    python -m benchmarks.concurrency  # serial vs. --threads vs. --jobs vs. --pipeline
+"""
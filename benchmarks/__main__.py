@@ -0,0 +1,199 @@
+"""
+Measure throughput over a synthetic corpus (see `corpus.py`), timing each stage
+of generating a card, and write the results as JSON so that they can be
+compared across commits:
+
+    python -m benchmarks --posts 1000 --json results-$(git rev-parse --short HEAD).json
+
+A summary is printed to stderr.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from unittest import mock
+
+import PIL
+
+import fmcardgen.draw
+from fmcardgen.config import CardGenConfig
+from fmcardgen.draw import Painter, RenderPlan
+from fmcardgen.encode import Encoder
+from fmcardgen.frontmatter import read_frontmatter
+from fmcardgen.generate import Generator
+
+from .corpus import make_site
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+
+class StageTimes:
+    """
+    Collects how long each call to each stage takes.
+    """
+
+    def __init__(self) -> None:
+        self.times: Dict[str, List[float]] = defaultdict(list)
+
+    def timed(self, stage: str, fn: Callable) -> Callable:
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.times[stage].append(time.perf_counter() - start)
+
+        return wrapper
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        summary = {}
+        for stage, times in self.times.items():
+            times = sorted(times)
+            summary[stage] = {
+                "calls": len(times),
+                "total_s": sum(times),
+                "mean_ms": sum(times) / len(times) * 1000,
+                "p50_ms": _percentile(times, 50) * 1000,
+                "p95_ms": _percentile(times, 95) * 1000,
+                "max_ms": times[-1] * 1000,
+            }
+        return summary
+
+
+def run(posts: int, seed: int, preset: str, directory: Path) -> Dict[str, Any]:
+    paths = make_site(directory, posts, seed)
+    (directory / "cards").mkdir(exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        return _run(paths, preset)
+    finally:
+        os.chdir(cwd)
+
+
+def _run(paths: List[Path], preset: str) -> Dict[str, Any]:
+    stages = StageTimes()
+    config = stages.timed("config", CardGenConfig.from_file)(Path("config.yml"))
+    config.encoding.preset = preset  # type: ignore[assignment]
+    generator = Generator(config, str(config.output))
+    encoder = Encoder(config.encoding)
+
+    with ExitStack() as patches:
+        # Stages inside draw() are timed by wrapping the functions that do them.
+        # Text is always drawn by Painter.text: BatchPainter.text only queues
+        # it up, to draw with Painter.text when it's flushed.
+        for target, name, stage in [
+            (fmcardgen.draw, "wrap_font_text", "wrap_font_text"),
+            (fmcardgen.draw, "_composite_rects", "rects"),
+            (Painter, "text", "text"),
+        ]:
+            timed = stages.timed(stage, getattr(target, name))
+            patches.enter_context(mock.patch.object(target, name, timed))
+
+        start = time.perf_counter()
+        plan = stages.timed("compile", RenderPlan)(config)
+        for path in paths:
+            fm = stages.timed("parse", read_frontmatter)(path)
+            dest = generator.destination(path, fm)
+            im = stages.timed("draw", plan.draw)(fm)
+            fmt = encoder.format_for(dest) or "png"
+            data = stages.timed("encode", encoder.encode)(im, fmt)
+            stages.timed("save", Path(dest).write_bytes)(data)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "posts": len(paths),
+        "preset": preset,
+        "seconds": elapsed,
+        "cards_per_second": len(paths) / elapsed,
+        "peak_rss_bytes": _peak_rss(),
+        "stages": stages.summary(),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--posts", type=int, default=500, help="corpus size")
+    parser.add_argument("--seed", type=int, default=1234, help="corpus random seed")
+    parser.add_argument(
+        "--preset", default="default", choices=["default", "fast", "small"]
+    )
+    parser.add_argument(
+        "--dir", type=Path, help="where to write the corpus (default: a temp dir)"
+    )
+    parser.add_argument("--json", type=Path, help="write results here, not stdout")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.dir or Path(tmp)
+        directory.mkdir(parents=True, exist_ok=True)
+        results = run(args.posts, args.seed, args.preset, directory.resolve())
+        results["seed"] = args.seed
+
+    _print_summary(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+def _percentile(sorted_times: List[float], percent: float) -> float:
+    index = round(percent / 100 * (len(sorted_times) - 1))
+    return sorted_times[index]
+
+
+def _peak_rss() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes everywhere else
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_summary(results: Dict[str, Any]) -> None:
+    err = sys.stderr
+    print(
+        f"{results['posts']} cards in {results['seconds']:.2f}s: "
+        f"{results['cards_per_second']:.1f} cards/sec",
+        file=err,
+    )
+    if results["peak_rss_bytes"] is not None:
+        print(f"peak RSS: {results['peak_rss_bytes'] / 2**20:.1f}MiB", file=err)
+    for stage, s in results["stages"].items():
+        print(
+            f"{stage:>15}: {s['total_s']:8.3f}s total, {s['calls']:6} calls, "
+            f"p50 {s['p50_ms']:7.2f}ms, p95 {s['p95_ms']:7.2f}ms",
+            file=err,
+        )
+
+
+if __name__ == "__main__":
+    main()
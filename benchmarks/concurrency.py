@@ -0,0 +1,126 @@
+"""
+Compare rendering a synthetic corpus (see `corpus.py`) one card at a time, with
+`--threads N`, with `--jobs N` worker processes, and with `--pipeline`:
+wall-clock time, and the peak memory of the whole run, workers included.
+Threads (and the pipeline's stages) share one copy of the fonts and template;
+each worker process has its own.
+
+    python -m benchmarks.concurrency --posts 500 --workers 4
+
+Memory is measured by sampling the RSS of the process and its children from
+/proc, so it's only reported on Linux.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .__main__ import _git_commit
+from .corpus import make_site
+
+SAMPLE_INTERVAL = 0.01
+
+
+def modes(workers: int) -> Dict[str, List[str]]:
+    return {
+        "serial": ["--jobs", "1"],
+        f"{workers} threads": ["--threads", str(workers)],
+        f"{workers} processes": ["--jobs", str(workers)],
+        "pipeline": ["--pipeline"],
+    }
+
+
+def measure(directory: Path, options: List[str]) -> Dict[str, Any]:
+    command = [
+        sys.executable,
+        "-m",
+        "fmcardgen.cli",
+        "--config",
+        "config.yml",
+        "--recursive",
+        *options,
+        "posts",
+    ]
+    start = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=directory, stdout=subprocess.DEVNULL)
+    peak = 0
+    while proc.poll() is None:
+        rss = _tree_rss(proc.pid)
+        peak = max(peak, rss or 0)
+        time.sleep(SAMPLE_INTERVAL)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} exited with {proc.returncode}")
+    return {"seconds": elapsed, "peak_rss_bytes": peak or None}
+
+
+def run(posts: int, seed: int, workers: int, directory: Path) -> Dict[str, Any]:
+    paths = make_site(directory, posts, seed)
+    (directory / "cards").mkdir(exist_ok=True)
+    results: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "posts": len(paths),
+        "workers": workers,
+        "modes": {},
+    }
+    for name, options in modes(workers).items():
+        result = measure(directory, options)
+        result["cards_per_second"] = len(paths) / result["seconds"]
+        results["modes"][name] = result
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.concurrency")
+    parser.add_argument("--posts", type=int, default=500, help="corpus size")
+    parser.add_argument("--seed", type=int, default=1234, help="corpus random seed")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="threads or processes to compare (default: number of CPUs)",
+    )
+    parser.add_argument("--json", type=Path, help="write results here, not stdout")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run(args.posts, args.seed, args.workers, Path(tmp).resolve())
+
+    for name, r in results["modes"].items():
+        rss = r["peak_rss_bytes"]
+        print(
+            f"{name:>14}: {r['seconds']:7.2f}s, {r['cards_per_second']:6.1f} cards/sec"
+            + (f", peak RSS {rss / 2**20:6.1f}MiB" if rss else ""),
+            file=sys.stderr,
+        )
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+def _tree_rss(pid: int) -> Optional[int]:
+    """
+    The total resident memory of a process and all its descendants, in bytes,
+    or None if it can't be read (e.g. not on Linux, or the process has exited).
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        children: List[int] = []
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except (OSError, ValueError):
+        return None
+    return rss + sum(_tree_rss(child) or 0 for child in children)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Synthetic posts, and a config that exercises every kind of field, to benchmark
+against.
+"""
+
+import datetime
+import random
+import shutil
+from pathlib import Path
+from typing import List
+
+import yaml
+
+TESTS_DIR = Path(__file__).parent.parent / "tests"
+
+WORDS = (
+    "the and of a to in is for on with as by at from an this that how why what "
+    "python django performance rendering cards frontmatter static site generator "
+    "notes on building better software teams security review incident response "
+    "hiring managing engineers open source maintainers databases caching"
+).split()
+
+AUTHORS = ["Jacob", "Ada Lovelace", "Grace Hopper", "Someone With A Long Name"]
+
+CONFIG = {
+    "template": "template.png",
+    "output": "cards/{file_stem}.png",
+    "fonts": [
+        {"name": "regular", "path": "RobotoCondensed/RobotoCondensed-Regular.ttf"},
+        {"name": "bold", "path": "RobotoCondensed/RobotoCondensed-Bold.ttf"},
+        {"name": "light", "path": "RobotoCondensed/RobotoCondensed-Light.ttf"},
+    ],
+    "defaults": {"font": "regular", "font_size": 40, "fg": "white"},
+    "fields": [
+        # wrapped titles, over a translucent background
+        {
+            "source": "title",
+            "font": "bold",
+            "font_size": 60,
+            "x": 80,
+            "y": 100,
+            "max_width": 1040,
+            "bg": "#00000080",
+            "padding": 10,
+        },
+        # multiple sources, one of them parsed
+        {
+            "source": ["author", "date"],
+            "format": "{author} – {date:%B %-d, %Y}",
+            "parse": {"date": "datetime"},
+            "font": "light",
+            "x": 80,
+            "y": 460,
+        },
+        # lots of tags, each with a translucent background
+        {
+            "source": "tags",
+            "multi": True,
+            "optional": True,
+            "font_size": 28,
+            "x": 80,
+            "y": 540,
+            "bg": "#3366cc99",
+            "padding": {"horizontal": 8, "vertical": 4},
+        },
+    ],
+}
+
+
+def make_site(directory: Path, posts: int, seed: int = 1234) -> List[Path]:
+    """
+    Set up a site to benchmark in `directory`: a config (config.yml), the test
+    template and fonts, and `posts` posts (under posts/). Returns the posts.
+    """
+    rng = random.Random(seed)
+    shutil.copy(TESTS_DIR / "template.png", directory)
+    shutil.copytree(
+        TESTS_DIR / "RobotoCondensed",
+        directory / "RobotoCondensed",
+        dirs_exist_ok=True,
+    )
+    (directory / "config.yml").write_text(yaml.safe_dump(CONFIG))
+
+    (directory / "posts").mkdir(exist_ok=True)
+    paths = []
+    for i in range(posts):
+        path = directory / "posts" / f"post-{i:06}.md"
+        path.write_text(_post(rng))
+        paths.append(path)
+    return paths
+
+
+def _post(rng: random.Random) -> str:
+    # mostly short titles, some that need wrapping over several lines
+    title_words = rng.choice([3, 5, 8, 12, 25])
+    fm = {
+        "title": " ".join(rng.choices(WORDS, k=title_words)).capitalize(),
+        "author": rng.choice(AUTHORS),
+        "date": (
+            datetime.date(2010, 1, 1) + datetime.timedelta(days=rng.randrange(5000))
+        ).isoformat(),
+        "tags": rng.sample(WORDS, k=rng.choice([0, 1, 3, 8, 15])),
+    }
+    body = " ".join(rng.choices(WORDS, k=200))
+    return f"---\n{yaml.safe_dump(fm)}---\n\n{body}\n"
@@ -0,0 +1,43 @@
+"""
+Time encoding a typical card in each output format, with each encoder preset
+(and, for PNGs, with and without palette quantization), and report the size of
+the result.
+
+Run from the repository root:
+
+    python -m benchmarks.encode
+"""
+
+import os
+import timeit
+from pathlib import Path
+from typing import get_args
+
+from fmcardgen.config import CardGenConfig, EncodingConfig, EncodingPreset, ImageFormat
+from fmcardgen.draw import draw
+from fmcardgen.encode import Encoder
+from fmcardgen.frontmatter import read_frontmatter
+
+TESTS_DIR = Path(__file__).parent.parent / "tests"
+
+
+def main() -> None:
+    os.chdir(TESTS_DIR)
+    config = CardGenConfig.from_file(Path("config.yml"))
+    card = draw(read_frontmatter("example.md"), config)
+
+    for fmt in get_args(ImageFormat):
+        for palette in [False, True] if fmt == "png" else [False]:
+            for preset in get_args(EncodingPreset):
+                encoding = EncodingConfig(format=fmt, preset=preset, palette=palette)
+                encoder = Encoder(encoding)
+                size = len(encoder.encode(card, fmt))
+                elapsed = min(
+                    timeit.repeat(lambda: encoder.encode(card, fmt), number=1, repeat=5)
+                )
+                label = f"{fmt}{' palette' if palette else ''} {preset}"
+                print(f"{label:>20}: {elapsed * 1000:7.1f}ms, {size / 1024:7.1f}KiB")
+
+
+if __name__ == "__main__":
+    main()
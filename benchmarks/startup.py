@@ -0,0 +1,130 @@
+"""
+Time how long fmcardgen takes to start: wall-clock time for a few short
+commands, each run in a fresh interpreter, plus a `python -X importtime`
+breakdown of what gets imported along the way. Write the results as JSON to
+compare them across commits:
+
+    python -m benchmarks.startup --json startup-$(git rev-parse --short HEAD).json
+
+A summary is printed to stderr.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .__main__ import _git_commit, _percentile
+
+TESTS_DIR = Path(__file__).parent.parent / "tests"
+
+
+def commands(output: Path) -> Dict[str, List[str]]:
+    python = [sys.executable]
+    return {
+        "import": [*python, "-c", "import fmcardgen.cli"],
+        "help": [*python, "-m", "fmcardgen.cli", "--help"],
+        "one post": [
+            *python,
+            "-m",
+            "fmcardgen.cli",
+            "--config",
+            "config.yml",
+            "--output",
+            str(output / "{file_stem}.png"),
+            "--jobs",
+            "1",
+            "example.md",
+        ],
+    }
+
+
+def wall_times(command: List[str], runs: int) -> Dict[str, float]:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=TESTS_DIR, capture_output=True, check=True)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {
+        "runs": runs,
+        "min_ms": times[0] * 1000,
+        "p50_ms": _percentile(times, 50) * 1000,
+        "max_ms": times[-1] * 1000,
+    }
+
+
+def import_times(command: List[str]) -> Dict[str, float]:
+    """
+    The cumulative import time, in ms, of each top-level package `command`
+    imports, slowest first, parsed from `python -X importtime`'s output.
+    """
+    result = subprocess.run(
+        [command[0], "-X", "importtime", *command[1:]],
+        cwd=TESTS_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    packages: Dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package", with the
+        # package indented by how deeply it's nested
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if name.startswith("  "):
+            continue
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(cumulative) / 1000
+    return dict(sorted(packages.items(), key=lambda p: p[1], reverse=True))
+
+
+def run(runs: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "commands": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, command in commands(Path(tmp)).items():
+            results["commands"][name] = {
+                **wall_times(command, runs),
+                "imports_ms": import_times(command),
+            }
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument("--runs", type=int, default=10, help="runs per command")
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to show")
+    parser.add_argument("--json", type=Path, help="write results here, not stdout")
+    args = parser.parse_args(argv)
+
+    results = run(args.runs)
+
+    err = sys.stderr
+    for name, r in results["commands"].items():
+        print(
+            f"{name:>10}: p50 {r['p50_ms']:7.1f}ms, min {r['min_ms']:7.1f}ms",
+            file=err,
+        )
+        slowest = list(r["imports_ms"].items())[: args.top]
+        print(
+            " " * 12 + ", ".join(f"{pkg} {ms:.0f}ms" for pkg, ms in slowest),
+            file=err,
+        )
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
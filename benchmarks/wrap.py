@@ -0,0 +1,62 @@
+"""
+Compare wrap_font_text with and without its chunk width cache, over a corpus of
+titles and descriptions that share a lot of words (as real posts do).
+
+Run from the repository root:
+
+    python -m benchmarks.wrap
+"""
+
+import random
+import timeit
+from pathlib import Path
+
+from PIL import ImageFont
+
+from fmcardgen import draw
+
+FONT = Path(__file__).parent.parent / "tests/RobotoCondensed/RobotoCondensed-Bold.ttf"
+
+WORDS = (
+    "the and of a to in is for on with as by at from an this that how why what "
+    "python django performance rendering cards frontmatter static site generator "
+    "Jacob Kaplan-Moss notes on building better software teams security review"
+).split()
+
+
+def corpus(n: int, words_per_text: int) -> list:
+    rng = random.Random(1234)
+    return [" ".join(rng.choices(WORDS, k=words_per_text)) for _ in range(n)]
+
+
+def uncached_width(font, chunk):
+    return int(font.getlength(chunk))
+
+
+def main() -> None:
+    font = ImageFont.truetype(str(FONT), 40)
+    for label, words_per_text in [("long titles", 20), ("descriptions", 60)]:
+        texts = corpus(1000, words_per_text)
+
+        def run() -> None:
+            for text in texts:
+                draw.wrap_font_text(font, text, 900)
+
+        cached_width = draw._chunk_width
+        try:
+            draw._chunk_width = uncached_width  # type: ignore[assignment]
+            uncached = min(timeit.repeat(run, number=1, repeat=5))
+        finally:
+            draw._chunk_width = cached_width
+
+        cached_width.cache_clear()
+        cached = min(timeit.repeat(run, number=1, repeat=5))
+
+        print(
+            f"{label:>14}: uncached {uncached * 1000:7.1f}ms, "
+            f"cached {cached * 1000:7.1f}ms ({uncached / cached:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Generate images -- social cards, say -- from documents with frontmatter.
+
+The library API is `CardRenderer` (see `fmcardgen.renderer`), configured with
+a `CardGenConfig`. They're imported on first use, so that importing the
+command line (which lives in this package too) stays quick.
+"""
+
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .config import CardGenConfig
+    from .renderer import CardRenderer
+
+__all__ = ["CardGenConfig", "CardRenderer"]
+
+_exports = {"CardGenConfig": "config", "CardRenderer": "renderer"}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+
+    return getattr(import_module(f".{_exports[name]}", __name__), name)
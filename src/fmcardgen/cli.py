@@ -1,86 +1,669 @@
-import typer
-import frontmatter
+"""
+The command line. Only typer and the standard library are imported up front:
+everything else -- pydantic, Pillow, the frontmatter parsers -- is imported by
+the commands that need it, so `fmcardgen --help` (and the work before a card
+is drawn) doesn't wait on it.
+"""
+
+from __future__ import annotations
+
+import os
+from collections import deque
 from pathlib import Path
-from typing import List, Optional
-from rich import print
-from .config import CardGenConfig
-from .draw import draw
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    get_args,
+)
+
+import typer
+from typer.core import TyperGroup
+
+from .walk import DEFAULT_IGNORE
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future, ProcessPoolExecutor
+
+    from .config import CardGenConfig
+    from .generate import GenerateResult, Generator
+    from .manifest import Manifest
+
+
+class _DefaultCommandGroup(TyperGroup):
+    """
+    Treats `fmcardgen ARGS` as `fmcardgen render ARGS`, unless the first argument
+    is another command, so that generating cards doesn't need a subcommand.
+    """
+
+    default_command = "render"
+
+    def parse_args(self, ctx: Any, args: List[str]) -> List[str]:
+        own_options = {opt for param in self.get_params(ctx) for opt in param.opts}
+        if not args or (args[0] not in self.commands and args[0] not in own_options):
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
+
+
+cli = typer.Typer(cls=_DefaultCommandGroup)
 
-cli = typer.Typer()
+# Arguments and options shared between commands
+
+POSTS = typer.Argument(
+    ...,
+    help="post file(s), or directories with --recursive",
+    exists=True,
+    readable=True,
+    resolve_path=True,
+)
+CONFIG = typer.Option(
+    None,
+    "--config",
+    "-c",
+    help="path to config file (toml, yaml, or json)",
+    file_okay=True,
+    dir_okay=True,
+    readable=True,
+    resolve_path=True,
+)
+CONFIG_CACHE = typer.Option(
+    None,
+    "--config-cache",
+    help="directory to cache parsed configs in, to skip parsing them next time",
+    envvar="FMCARDGEN_CONFIG_CACHE",
+    file_okay=False,
+    resolve_path=True,
+)
+OUTPUT = typer.Option(
+    None,
+    "--output",
+    "-o",
+    help="path to generate images; can contain {placeholders} (see docs)",
+)
+RECURSIVE = typer.Option(
+    False,
+    "--recursive",
+    "-r",
+    help="walk directories given by POSTS looking for files with frontmatter",
+)
+EXT = typer.Option(
+    ["md", "rst", "rest", "txt"],
+    "--ext",
+    "-e",
+    help="with --recursive, file extensions that are considered to be posts",
+)
+IGNORE = typer.Option(
+    [],
+    "--ignore",
+    "-x",
+    help="with --recursive, skip files and directories matching this "
+    ".gitignore-style pattern (can be repeated)",
+)
+GITIGNORE = typer.Option(
+    True,
+    help="with --recursive, also skip anything listed in .gitignore files",
+)
+
+
+def _one_of(literal: str) -> Callable[[Optional[str]], Optional[str]]:
+    """
+    Check an option's value is one of the choices of the `Literal` type named
+    `literal` in `config`, which is only imported once there's a value to check.
+    """
+
+    def check(value: Optional[str]) -> Optional[str]:
+        if value is not None:
+            from . import config
+
+            choices = get_args(getattr(config, literal))
+            if value not in choices:
+                raise typer.BadParameter(f"must be one of: {', '.join(choices)}")
+        return value
+
+    return check
+
+
+FORMAT = typer.Option(
+    None,
+    "--format",
+    "-f",
+    help="image format: png, webp, jpeg or avif [default: from the output file's extension]",
+    callback=_one_of("ImageFormat"),
+    show_default=False,
+)
+PRESET = typer.Option(
+    None,
+    "--preset",
+    help="encoder settings: default, fast (quicker to encode) or small (fewer bytes)",
+    callback=_one_of("EncodingPreset"),
+)
+COMPRESS_LEVEL = typer.Option(
+    None, "--compress-level", min=0, max=9, help="PNG compression level, 0-9"
+)
+QUALITY = typer.Option(
+    None, "--quality", min=1, max=100, help="WebP, JPEG and AVIF quality, 1-100"
+)
+PALETTE = typer.Option(
+    None,
+    "--palette/--no-palette",
+    help="quantize PNGs to a palette when that doesn't lose much quality",
+    show_default=False,
+)
+MAX_COLORS = typer.Option(
+    None, "--max-colors", min=2, max=256, help="with --palette, palette size"
+)
 
 
 @cli.command()
-def main(
-    posts: List[Path] = typer.Argument(
-        ...,
-        help="post file(s), or directories with --recursive",
-        exists=True,
-        readable=True,
+def render(
+    posts: List[Path] = POSTS,
+    config: Optional[Path] = CONFIG,
+    config_cache: Optional[Path] = CONFIG_CACHE,
+    output: Optional[str] = OUTPUT,
+    recursive: bool = RECURSIVE,
+    ext: List[str] = EXT,
+    ignore: List[str] = IGNORE,
+    gitignore: bool = GITIGNORE,
+    format: Optional[str] = FORMAT,
+    preset: Optional[str] = PRESET,
+    compress_level: Optional[int] = COMPRESS_LEVEL,
+    quality: Optional[int] = QUALITY,
+    palette: Optional[bool] = PALETTE,
+    max_colors: Optional[int] = MAX_COLORS,
+    jobs: Optional[int] = typer.Option(
+        None,
+        "--jobs",
+        "-j",
+        min=1,
+        help="number of worker processes to render with [default: number of CPUs, or 1 for a single post]",
+        show_default=False,
+    ),
+    threads: Optional[int] = typer.Option(
+        None,
+        "--threads",
+        "-t",
+        min=1,
+        help="render with this many threads in one process, instead of worker "
+        "processes; uses less memory, since fonts and the template are shared",
+        show_default=False,
+    ),
+    pipeline: bool = typer.Option(
+        False,
+        "--pipeline",
+        help="read posts, draw cards, and encode and write them in separate "
+        "stages, each with its own threads, so that slow writes overlap drawing",
+    ),
+    readers: int = typer.Option(
+        1, "--readers", min=1, help="with --pipeline, threads reading posts"
+    ),
+    renderers: int = typer.Option(
+        1, "--renderers", min=1, help="with --pipeline, threads drawing cards"
+    ),
+    writers: int = typer.Option(
+        2,
+        "--writers",
+        min=1,
+        help="with --pipeline, threads encoding and writing cards",
+    ),
+    queue_size: int = typer.Option(
+        4,
+        "--queue-size",
+        min=1,
+        help="with --pipeline, posts each stage can queue up for the next",
+    ),
+    max_memory: Optional[str] = typer.Option(
+        None,
+        "--max-memory",
+        metavar="SIZE",
+        help="keep the run within about this much memory (e.g. 2G), by limiting "
+        "workers and how many cards are in flight; reports peak memory per stage",
+        show_default=False,
+    ),
+    manifest: Optional[Path] = typer.Option(
+        None,
+        "--manifest",
+        "-m",
+        help="record generated cards in this file, and skip posts whose cards are up to date",
+        dir_okay=False,
         resolve_path=True,
     ),
-    config: Optional[Path] = typer.Option(
+    store: Optional[Path] = typer.Option(
         None,
-        "--config",
-        "-c",
-        help="path to config file (toml, yaml, or json)",
-        file_okay=True,
-        dir_okay=True,
-        readable=True,
+        "--store",
+        help="keep cards in this directory, so identical cards in later runs are copied rather than drawn",
+        file_okay=False,
         resolve_path=True,
     ),
-    output: Optional[str] = typer.Option(
+    profile: bool = typer.Option(
+        False, "--profile", help="report how long each stage of generating cards takes"
+    ),
+    trace: Optional[Path] = typer.Option(
         None,
-        "--output",
-        "-o",
-        help="path to generate images; can contain {placeholders} (see docs)",
+        "--trace",
+        help="write a Chrome trace-event file of each card's stages (implies --profile)",
+        dir_okay=False,
+        resolve_path=True,
     ),
-    recursive: bool = typer.Option(
-        False,
-        "--recursive",
-        "-r",
-        help="walk directories given by POSTS looking for files with frontmatter",
+):
+    """
+    Generate cards for posts. This is the default command.
+    """
+    from .dependencies import config_digest
+    from .generate import Generator, find_posts
+    from .manifest import Manifest
+    from .store import CardStore
+
+    _check_recursive(posts, recursive)
+    if [jobs is not None, threads is not None, pipeline].count(True) > 1:
+        typer.echo("pass only one of --jobs, --threads, or --pipeline", err=True)
+        raise typer.Exit(1)
+
+    cnf = _load_config(config, config_cache)
+    output = str(cnf.output if output is None else output)
+    _set_encoding(
+        cnf,
+        format=format,
+        preset=preset,
+        compress_level=compress_level,
+        quality=quality,
+        palette=palette,
+        max_colors=max_colors,
+    )
+
+    if jobs is None and len(posts) == 1 and not posts[0].is_dir():
+        # A single post (from an editor's on-save hook, say) renders sooner
+        # here than it would after starting a worker process for it
+        jobs = 1
+    jobs = jobs or os.cpu_count() or 1
+
+    if max_memory is not None:
+        from .memory import MemoryBudget, card_bytes, parse_size
+
+        try:
+            budget = MemoryBudget(parse_size(max_memory), card_bytes(cnf.template))
+            if pipeline:
+                renderers, writers, queue_size = budget.pipeline(
+                    renderers, writers, queue_size
+                )
+                fits = (
+                    f"{renderers} renderers, {writers} writers, queues of {queue_size}"
+                )
+            elif threads is not None:
+                threads = budget.threads(threads)
+                fits = f"{threads} thread{'s' if threads > 1 else ''}"
+            else:
+                jobs = budget.processes(jobs)
+                fits = f"{jobs} process{'es' if jobs > 1 else ''}"
+        except ValueError as e:
+            raise typer.BadParameter(str(e), param_hint="--max-memory")
+        typer.echo(f"rendering with {fits}, to fit in {max_memory}", err=True)
+
+    mf = Manifest.load(manifest) if manifest else None
+    generator = Generator(
+        cnf,
+        output,
+        config_digest(cnf, output) if mf else None,
+        profile=profile or trace is not None or max_memory is not None,
+        store=CardStore(store),
+    )
+    report = None
+    if generator.profile:
+        from .profile import ProfileReport
+
+        # --max-memory on its own only needs the peak memory of each stage
+        report = ProfileReport(
+            timings=profile or trace is not None, trace=trace is not None
+        )
+    found = find_posts(posts, ext, DEFAULT_IGNORE + ignore, gitignore)
+    todo = _PendingPosts(found, mf, generator.config_digest)
+
+    if pipeline:
+        from .pipeline import Pipeline
+
+        stages = Pipeline(generator, readers, renderers, writers, queue_size)
+        results = stages.run(todo)
+    else:
+        results = _run(todo, generator, jobs, threads)
+
+    failed = False
+    unchanged = 0
+    reused = 0
+    try:
+        for result in results:
+            if result.error is not None:
+                failed = True
+            if result.reused:
+                reused += 1
+            if result.unchanged:
+                unchanged += 1
+            else:
+                _report(result)
+            if report is not None and result.profile is not None:
+                report.add(result.post, result.profile)
+
+            if mf is not None:
+                if result.error is None:
+                    assert generator.config_digest is not None
+                    assert result.digest is not None and result.dest is not None
+                    assert result.stamp is not None
+                    mf.record(
+                        result.post,
+                        generator.config_digest,
+                        result.digest,
+                        result.dest,
+                        result.stamp,
+                    )
+                else:
+                    mf.forget(result.post)
+    finally:
+        # Whatever happened, keep the record of the cards that were generated
+        if mf is not None:
+            mf.save()
+
+    if mf is not None and (todo.skipped or unchanged):
+        typer.echo(f"{todo.skipped + unchanged} cards already up to date")
+
+    if reused:
+        typer.echo(f"{reused} cards copied from identical cards")
+
+    if report is not None:
+        if report.timings:
+            report.print()
+        else:
+            report.print_memory()
+        if trace is not None:
+            report.write_chrome_trace(trace)
+            typer.echo(f"wrote trace to {trace}")
+
+    if failed:
+        raise typer.Exit(1)
+
+
+# `render` was called `main` before there were other commands; code that
+# imports it by that name keeps working
+main = render
+
+
+@cli.command()
+def watch(
+    posts: List[Path] = POSTS,
+    config: Optional[Path] = CONFIG,
+    output: Optional[str] = OUTPUT,
+    recursive: bool = RECURSIVE,
+    ext: List[str] = EXT,
+    ignore: List[str] = IGNORE,
+    gitignore: bool = GITIGNORE,
+    interval: float = typer.Option(
+        0.05, "--interval", min=0.01, help="seconds between checks for changes"
+    ),
+):
+    """
+    Re-generate cards as posts, the config, the template or fonts change.
+    """
+    from .watch import Watcher
+
+    _check_recursive(posts, recursive)
+    watcher = Watcher(posts, config, output, ext, DEFAULT_IGNORE + ignore, gitignore)
+    typer.echo("watching for changes; press Ctrl-C to stop", err=True)
+    try:
+        watcher.run(_report, interval)
+    except KeyboardInterrupt:
+        pass
+
+
+@cli.command()
+def serve(
+    root: Path = typer.Argument(
+        Path("."),
+        help="directory that ?post= paths are relative to",
+        exists=True,
+        file_okay=False,
+        resolve_path=True,
+    ),
+    config: Optional[Path] = CONFIG,
+    config_cache: Optional[Path] = CONFIG_CACHE,
+    host: str = typer.Option("127.0.0.1", "--host", help="address to listen on"),
+    port: int = typer.Option(8000, "--port", "-p", help="port to listen on"),
+    cache_size: int = typer.Option(
+        256, "--cache-size", min=1, help="number of rendered cards to keep in memory"
     ),
-    ext: List[str] = typer.Option(
-        ["md", "rst", "rest", "txt"],
-        "--ext",
-        "-e",
-        help="with --recursive, file extensions that are considered to be posts",
+    max_concurrency: int = typer.Option(
+        4, "--max-concurrency", min=1, help="number of cards to render at once"
     ),
+    format: Optional[str] = FORMAT,
+    preset: Optional[str] = PRESET,
+    compress_level: Optional[int] = COMPRESS_LEVEL,
+    quality: Optional[int] = QUALITY,
+    palette: Optional[bool] = PALETTE,
+    max_colors: Optional[int] = MAX_COLORS,
 ):
+    """
+    Run an HTTP server that renders cards on demand.
+    """
+    from .server import CardServer
+
+    cnf = _load_config(config, config_cache)
+    _set_encoding(
+        cnf,
+        format=format,
+        preset=preset,
+        compress_level=compress_level,
+        quality=quality,
+        palette=palette,
+        max_colors=max_colors,
+    )
+    server = CardServer((host, port), cnf, root, cache_size, max_concurrency)
+    typer.echo(f"serving cards on {server.url}/card; press Ctrl-C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
 
+def _check_recursive(posts: List[Path], recursive: bool) -> None:
     for post in posts:
         if post.is_dir() and not recursive:
             typer.echo("must pass --recursive to walk directories", err=True)
             raise typer.Exit(1)
 
-    cnf = CardGenConfig.from_file(config) if config else CardGenConfig()
-    output = str(cnf.output if output is None else output)
 
-    for post in posts:
-        if post.is_dir():
-            for e in ext:
-                for p in post.glob(f"**/*.{e}"):
-                    _generate(p, cnf, output)
-        else:
-            _generate(post, cnf, output)
+def _load_config(config: Optional[Path], cache: Optional[Path]) -> CardGenConfig:
+    from .config import CardGenConfig
 
+    return CardGenConfig.from_file(config, cache) if config else CardGenConfig()
 
-def _generate(post: Path, config: CardGenConfig, output: str) -> None:
-    fm, _ = frontmatter.parse(post.read_text())
-    im = draw(fm, config)
 
-    # handle Hugo-style bundles -- bundle/index.md or bundle/_index.md --
-    # by using the parent directory name, if relevant
-    if post.stem in ("index", "_index"):
-        file_name = post.parent.name
-        file_stem = post.parent.stem
+def _set_encoding(cnf: CardGenConfig, **options: Any) -> None:
+    """
+    Override the config's encoding settings with any given on the command line.
+    """
+    for name, value in options.items():
+        if value is not None:
+            setattr(cnf.encoding, name, value)
+
+
+def _report(result: GenerateResult) -> None:
+    if result.error is None:
+        typer.echo(f"{result.post} -> {result.dest}")
     else:
-        file_name = post.name
-        file_stem = post.stem
+        typer.echo(f"{result.post}: {result.error}", err=True)
+
+
+Job = Tuple[Path, Optional[str]]
+
+
+class _PendingPosts:
+    """
+    Pairs each post with the digest of its card's inputs from the last run, if
+    there's a manifest. Posts that haven't been touched since their card was
+    generated are skipped (and counted) without reading them at all.
+    """
+
+    def __init__(
+        self,
+        posts: Iterable[Path],
+        manifest: Optional[Manifest],
+        config_digest: Optional[str],
+    ) -> None:
+        self.posts = posts
+        self.manifest = manifest
+        self.config_digest = config_digest
+        self.skipped = 0
+
+    def __iter__(self) -> Iterator[Job]:
+        for post in self.posts:
+            if self.manifest is None or self.config_digest is None:
+                yield post, None
+            elif self.manifest.is_unchanged(post, self.config_digest):
+                self.skipped += 1
+            else:
+                yield post, self.manifest.previous_digest(post)
+
+
+def _run(
+    jobs: Iterable[Job],
+    generator: Generator,
+    processes: int,
+    threads: Optional[int] = None,
+) -> Iterator[GenerateResult]:
+    """
+    Generate a card for each job, yielding results in the same order as `jobs`
+    regardless of how many processes (or, if `threads` is given, threads in
+    this process) are rendering them.
+    """
+    if threads is not None and threads > 1:
+        # Pillow releases the GIL while compositing and encoding, and drawing
+        # only reads the generator's renderer, so threads can share it
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            yield from _imap(executor, generator, jobs, window=threads * 4)
+        return
+
+    if threads is not None or processes == 1:
+        yield from (generator(*job) for job in jobs)
+        return
+
+    yield from _run_in_processes(jobs, generator, processes)
+
+
+def _run_in_processes(
+    jobs: Iterable[Job], generator: Generator, processes: int
+) -> Iterator[GenerateResult]:
+    """
+    Generate a card for each job in a pool of worker processes, in order.
+
+    If a worker dies (say, it's killed for running out of memory), every post
+    the pool had in flight fails with it, and there's no telling which post
+    was to blame. So each of those posts is retried alone, in a worker of its
+    own, and only a post that kills that worker too is reported as an error;
+    then the rest of the posts carry on in a new pool.
+    """
+    from concurrent.futures.process import BrokenProcessPool
+
+    todo = iter(jobs)
+    while True:
+        pending: Deque[Tuple[Job, Future]] = deque()
+        with _process_pool(generator, processes) as executor:
+            try:
+                yield from _imap(
+                    executor, _generate_in_worker, todo, processes * 4, pending
+                )
+                return
+            except BrokenProcessPool:
+                pass
+        for job, future in pending:
+            if future.exception() is None:
+                yield future.result()
+            else:
+                yield _run_alone(job, generator)
+
+
+def _run_alone(job: Job, generator: Generator) -> GenerateResult:
+    from concurrent.futures.process import BrokenProcessPool
+
+    from .generate import error_result
+
+    with _process_pool(generator, 1) as executor:
+        try:
+            return executor.submit(_generate_in_worker, *job).result()
+        except BrokenProcessPool as e:
+            return error_result(job[0], e)
+
+
+def _process_pool(generator: Generator, processes: int) -> ProcessPoolExecutor:
+    from concurrent.futures import ProcessPoolExecutor
+
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_worker,
+        initargs=(generator,),
+    )
+
+
+def _imap(
+    executor: Executor,
+    fn: Callable[..., GenerateResult],
+    items: Iterable[Tuple],
+    window: int,
+    pending: Optional[Deque[Tuple[Tuple, Future]]] = None,
+) -> Iterator[GenerateResult]:
+    """
+    Like `executor.map()`, but lazy: only `window` items are submitted at a time,
+    so a long (or slow-to-produce) stream of posts doesn't all sit in memory.
+
+    Items that have been taken from `items` but whose results haven't been
+    yielded yet stay in `pending`, with their futures, so that if a future --
+    or submitting an item -- raises, the caller can tell which items went
+    unfinished.
+    """
+    from concurrent.futures import Future
+
+    if pending is None:
+        pending = deque()
+    for item in items:
+        try:
+            future = executor.submit(fn, *item)
+        except Exception as e:
+            # e.g. the pool broke since the last item was submitted
+            future = Future()
+            future.set_exception(e)
+            pending.append((item, future))
+            raise
+        pending.append((item, future))
+        if len(pending) >= window:
+            yield _next_result(pending)
+    while pending:
+        yield _next_result(pending)
+
+
+def _next_result(pending: Deque[Tuple[Tuple, Future]]) -> GenerateResult:
+    # Only forget the item once its result is in hand
+    result = pending[0][1].result()
+    pending.popleft()
+    return result
+
+
+# Per-process state for pool workers, set up once by _init_worker.
+_worker_generator: Optional[Generator] = None
+
+
+def _init_worker(generator: Generator) -> None:
+    global _worker_generator
+    _worker_generator = generator
+
 
-    dest = output.format(**dict(fm, file_name=file_name, file_stem=file_stem))
-    im.save(dest)
-    print(post, "->", dest)
+def _generate_in_worker(post: Path, previous_digest: Optional[str]) -> GenerateResult:
+    assert _worker_generator is not None
+    return _worker_generator(post, previous_digest)
 
 
 if __name__ == "__main__":
@@ -1,16 +1,25 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import os
 from pathlib import Path
-from typing import TYPE_CHECKING, Dict, List, Literal, Mapping, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Literal, Mapping, Optional, Union
 
 import toml
 import yaml
-from PIL import ImageFont
 from pydantic import BaseModel, Field, ValidationInfo, field_validator, model_validator
 from pydantic_extra_types.color import Color
 
 DEFAULT_FONT = "__DEFAULT__"
 
+# The first bytes of the font formats FreeType reads most often: TrueType,
+# OpenType, TrueType collections, and WOFF.
+FONT_SIGNATURES = {b"\x00\x01\x00\x00", b"true", b"typ1", b"OTTO", b"ttcf", b"wOFF"}
+
+# libyaml's loader, if PyYAML was built with it, is several times faster
+YAMLLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 # Workaround for mypy checks against FilePath
 # See https://github.com/samuelcolvin/pydantic/pull/2099
 if TYPE_CHECKING:
@@ -19,6 +28,8 @@ else:
     from pydantic import FilePath
 
 ParserOptions = Literal["datetime"]
+ImageFormat = Literal["png", "webp", "jpeg", "avif"]
+EncodingPreset = Literal["default", "fast", "small"]
 
 
 class PaddingConfig(BaseModel):
@@ -120,7 +131,15 @@ class FontConfig(BaseModel):
     @field_validator("path")
     @classmethod
     def check_font(cls, value: FilePath) -> FilePath:
+        # Files that start like a font are taken to be one, rather than opening
+        # them here: they get opened when cards are drawn, anyway. Anything
+        # else is opened, to see whether FreeType can read it.
         try:
+            with open(value, "rb") as f:
+                if f.read(4) in FONT_SIGNATURES:
+                    return value
+            from PIL import ImageFont
+
             ImageFont.truetype(str(value), size=12)
         except OSError as e:
             raise ValueError(f"couldn't open font {value}: {e}") from e
@@ -145,6 +164,21 @@ class ConfigDefaults(BaseModel):
     padding: int = 0
 
 
+class EncodingConfig(BaseModel):
+    model_config = {
+        "extra": "forbid",
+        "validate_assignment": True,
+    }
+
+    format: Optional[ImageFormat] = None
+    preset: EncodingPreset = "default"
+    compress_level: Optional[int] = Field(None, ge=0, le=9)
+    quality: Optional[int] = Field(None, ge=1, le=100)
+    palette: bool = False
+    max_colors: int = Field(256, ge=2, le=256)
+    max_palette_error: float = Field(4.0, ge=0)
+
+
 class CardGenConfig(BaseModel):
     model_config = {
         "extra": "forbid",
@@ -155,23 +189,55 @@ class CardGenConfig(BaseModel):
     output: Optional[str] = "out-{slug}.png"
     defaults: ConfigDefaults = ConfigDefaults()
     fonts: List[FontConfig] = []
+    batch_compositing: bool = False
+    encoding: EncodingConfig = EncodingConfig()
     text_fields: List[TextFieldConfig] = Field(
         [TextFieldConfig(x=10, y=10, source="title")], alias="fields"
     )
 
     @classmethod
-    def from_file(cls, path: Path) -> CardGenConfig:
-        text = path.read_text()
+    def from_file(cls, path: Path, cache: Optional[Path] = None) -> CardGenConfig:
+        """
+        Load a config file: TOML, YAML, or JSON, going by its extension (or, if
+        the extension doesn't say, whichever parses).
+
+        If `cache` is given, it's a directory to keep parsed configs in, as
+        JSON; loading the same file again skips parsing it. (Cached configs are
+        still validated, so a cached config is checked against the template
+        and fonts that are there now, the same as the file would be.)
+        """
+        data = path.read_bytes()
+        if cache is None:
+            return cls.model_validate(_parse_config(path, data.decode()))
+
+        key = hashlib.sha256(data)
+        key.update(Path(__file__).read_bytes())
+        cached = cache / f"config-{key.hexdigest()}.json"
+
         try:
-            config = toml.loads(text)
-        except toml.TomlDecodeError:
-            try:
-                config = yaml.safe_load(text)
-            except yaml.error.YAMLError:
-                raise ValueError(
-                    f"Couldn't load config file {path}: it doesn't appear to be TOML, YAML, or JSON."
-                )
-        return cls.model_validate(config)
+            return cls.model_validate_json(cached.read_bytes())
+        except Exception:
+            # Missing, damaged, or otherwise unusable: parse the file instead,
+            # which raises the real error if there's something wrong with it
+            pass
+
+        parsed = _parse_config(path, data.decode())
+        config = cls.model_validate(parsed)
+        try:
+            text = json.dumps(parsed)
+        except (TypeError, ValueError):
+            # e.g. YAML dates or binary, which JSON can't hold: don't cache it
+            return config
+        try:
+            cache.mkdir(parents=True, exist_ok=True)
+            tmp = cached.with_name(f"{cached.name}.{os.getpid()}.tmp")
+            tmp.write_text(text)
+            os.replace(tmp, cached)
+        except OSError:
+            # The cache is only an optimization: a run doesn't fail for want
+            # of one
+            pass
+        return config
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -213,3 +279,26 @@ class CardGenConfig(BaseModel):
             # Otherwise, assume it's a path
             else:
                 text_field.font = Path(font)
+
+
+def _parse_config(path: Path, text: str) -> Any:
+    suffix = path.suffix.lower()
+    try:
+        if suffix == ".toml":
+            return toml.loads(text)
+        elif suffix in (".yml", ".yaml"):
+            return yaml.load(text, Loader=YAMLLoader)
+        elif suffix == ".json":
+            return json.loads(text)
+    except (toml.TomlDecodeError, yaml.error.YAMLError, ValueError) as e:
+        raise ValueError(f"Couldn't load config file {path}: {e}") from e
+
+    try:
+        return toml.loads(text)
+    except toml.TomlDecodeError:
+        try:
+            return yaml.load(text, Loader=YAMLLoader)
+        except yaml.error.YAMLError:
+            raise ValueError(
+                f"Couldn't load config file {path}: it doesn't appear to be TOML, YAML, or JSON."
+            )
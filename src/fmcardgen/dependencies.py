@@ -0,0 +1,137 @@
+"""
+What a card depends on: which frontmatter keys a config reads, and digests of
+a post's values for just those keys.
+
+Everything that skips or reuses work -- the manifest, the card store, the serve
+command's cache -- is keyed by these digests, so editing a post's body, or
+frontmatter that no card shows, doesn't cause a re-render.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from string import Formatter
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping
+
+from .config import DEFAULT_FONT, CardGenConfig
+
+# Placeholders that `Generator.destination` fills in itself, rather than from
+# frontmatter
+OUTPUT_SPECIAL_KEYS = frozenset({"file_name", "file_stem"})
+
+
+def placeholder_keys(pattern: str) -> FrozenSet[str]:
+    """
+    The names used by {placeholders} in a format string, without any attribute
+    or index: "{date.year}-{tags[0]}" uses "date" and "tags". Positional
+    placeholders ("{}", "{0}") are skipped.
+    """
+    keys = set()
+    for _, name, spec, _ in Formatter().parse(pattern):
+        if name:
+            name = name.split(".")[0].split("[")[0]
+            if not name.isdigit():
+                keys.add(name)
+        if spec:
+            # nested placeholders, like "{title:{width}}"
+            keys.update(placeholder_keys(spec))
+    return frozenset(keys)
+
+
+def card_keys(config: CardGenConfig) -> FrozenSet[str]:
+    """
+    The frontmatter keys that can affect what a card looks like: each field's
+    source(s), and anything its `format` refers to.
+    """
+    keys = set()
+    for field in config.text_fields:
+        keys.update([field.source] if isinstance(field.source, str) else field.source)
+        if field.format:
+            keys.update(placeholder_keys(field.format))
+    return frozenset(keys)
+
+
+def output_keys(output: str) -> FrozenSet[str]:
+    """
+    The frontmatter keys that can affect where a card is written.
+    """
+    return placeholder_keys(output) - OUTPUT_SPECIAL_KEYS
+
+
+def used_keys(config: CardGenConfig, output: str) -> FrozenSet[str]:
+    """
+    The frontmatter keys that can affect a card, or where it's written.
+    """
+    return card_keys(config) | output_keys(output)
+
+
+def config_digest(config: CardGenConfig, output: str) -> str:
+    """
+    Hash everything that affects every card in a run: the config itself, the
+    output pattern, and the contents of the template and font files.
+
+    `output` is the pattern actually in use (which the command line can
+    override), so `config.output` is left out.
+    """
+    h = hashlib.sha256()
+    h.update(config.model_dump_json(exclude={"output"}).encode())
+    h.update(output.encode())
+    for path in config_files(config):
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def config_files(config: CardGenConfig) -> List[Path]:
+    """
+    The files every card drawn with `config` reads: its template and fonts.
+    """
+    files = [Path(config.template)]
+    files.extend(
+        Path(str(f.font)) for f in config.text_fields if f.font != DEFAULT_FONT
+    )
+    return files
+
+
+class Dependencies:
+    """
+    A config digest plus a set of frontmatter keys: together, everything that
+    goes into a card (or, with output keys, a card and where it's written).
+    """
+
+    __slots__ = ("config_digest", "keys")
+
+    def __init__(self, config_digest: str, keys: Iterable[str]) -> None:
+        self.config_digest = config_digest
+        self.keys = tuple(sorted(keys))
+
+    @classmethod
+    def of_cards(cls, config: CardGenConfig) -> Dependencies:
+        """
+        What cards made with `config` look like, wherever they're written.
+        """
+        return cls(config_digest(config, ""), card_keys(config))
+
+    def project(self, fm: Mapping[str, Any]) -> Dict[str, Any]:
+        """
+        Just the parts of `fm` that matter. Keys that are missing stay missing,
+        since that isn't always the same as being null.
+        """
+        return {key: fm[key] for key in self.keys if key in fm}
+
+    def digest(self, fm: Mapping[str, Any]) -> str:
+        """
+        Hash a post's frontmatter: two posts with the same digest get the same
+        card. Anything that isn't JSON (like dates) is hashed as its str().
+        """
+        h = hashlib.sha256(self.config_digest.encode())
+        h.update(
+            json.dumps(
+                self.project(fm),
+                sort_keys=True,
+                separators=(",", ":"),
+                default=str,
+            ).encode()
+        )
+        return h.hexdigest()
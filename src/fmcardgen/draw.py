@@ -1,7 +1,10 @@
+import functools
+import math
+import os
+from pathlib import Path
 from textwrap import TextWrapper
-from typing import List, Mapping, Optional, Tuple, Union, cast
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union, cast
 
-import dateutil.parser
 from PIL import Image, ImageDraw, ImageFont
 from pydantic_extra_types.color import Color
 
@@ -17,27 +20,155 @@ from .frontmatter import (
     get_frontmatter_formatted,
     get_frontmatter_list,
     get_frontmatter_value,
+    parse_datetime,
 )
+from .profile import stage
 
 FontType = Union[ImageFont.FreeTypeFont, ImageFont.ImageFont]
 
 
 def draw(fm: dict, cnf: CardGenConfig) -> Image.Image:
-    im = Image.open(cnf.template)
-    for field in cnf.text_fields:
-        if field.multi:
-            _draw_multi(fm, im, field)
-        elif isinstance(field.source, list):
-            _draw_multi_source(fm, im, field)
-        else:
-            _draw_single_source(fm, im, field)
+    return RenderPlan(cnf).draw(fm)
+
+
+class RenderPlan:
+    """
+    A card config, "compiled" into what's needed to actually draw it: parsers,
+    fonts, and colors are all looked up (and converted to PIL's terms) once,
+    when the plan is created, rather than for every card.
+
+    Use this instead of `draw()` when drawing many cards with the same config.
+    The plan doesn't track changes to the config it's created from.
+    """
+
+    __slots__ = ("template", "fields", "batch_compositing")
+
+    def __init__(self, cnf: CardGenConfig) -> None:
+        self.template = str(cnf.template)
+        self.fields = tuple(_compile_field(field) for field in cnf.text_fields)
+        self.batch_compositing = cnf.batch_compositing
+
+    def draw(self, fm: Mapping[str, Any]) -> Image.Image:
+        with stage("template"):
+            im = load_template(self.template)
+        painter = BatchPainter(im) if self.batch_compositing else Painter(im)
+        for field in self.fields:
+            with stage(field.stage_name):
+                field.draw(fm, painter)
+        painter.flush()
+        return im
+
+
+# (left, top, right, bottom)
+Padding = Tuple[int, int, int, int]
+
+
+class FieldPlan:
+    """
+    A single field's part of a RenderPlan.
+
+    `value` gets the field's value from a post's frontmatter, all ready to draw.
+    It returns None if there's nothing to draw.
+    """
+
+    # what drawing this kind of field is called in profiles
+    stage_name = "field"
+
+    __slots__ = (
+        "value",
+        "font",
+        "xy",
+        "fg",
+        "bg",
+        "padding",
+        "wrap",
+        "max_width",
+        "spacing",
+    )
+
+    def __init__(
+        self, field: TextFieldConfig, value: Callable[[Mapping[str, Any]], Any]
+    ) -> None:
+        assert isinstance(field.padding, PaddingConfig)  # for mypy
+        assert isinstance(field.fg, Color)  # for mypy
+
+        self.value = value
+        self.font = load_font(str(field.font), field.font_size)
+        self.xy = (field.x, field.y)
+        self.fg = to_pil_color(field.fg)
+        self.bg = to_pil_color(field.bg) if field.bg else None
+        p = field.padding
+        self.padding: Padding = (p.left, p.top, p.right, p.bottom)
+        self.wrap = field.wrap
+        self.max_width = field.max_width
+        self.spacing = field.spacing
+
+    def draw(self, fm: Mapping[str, Any], painter: "Painter") -> None:
+        value = self.value(fm)
+        if value is not None:
+            self.paint(painter, value)
+
+    def paint(self, painter: "Painter", value: Any) -> None:
+        raise NotImplementedError  # pragma: no cover
+
+
+class TextFieldPlan(FieldPlan):
+    __slots__ = ()
+    stage_name = "text field"
 
-    return im
+    def paint(self, painter: "Painter", text: str) -> None:
+        if self.wrap:
+            max_width = self.max_width or painter.im.width - self.xy[0]
+            with stage("wrap"):
+                text = wrap_font_text(self.font, text, max_width)
 
+        if self.bg is not None:
+            bbox = painter.draw.textbbox(xy=self.xy, text=text, font=self.font)
+            painter.rect(_pad_box(bbox, self.padding), self.bg)
 
-def _draw_single_source(fm: dict, im: Image.Image, field: TextFieldConfig) -> None:
+        painter.text(self.xy, text, self.font, self.fg)
+
+
+class TagFieldPlan(FieldPlan):
+    __slots__ = ()
+    stage_name = "tags field"
+
+    def paint(self, painter: "Painter", tags: List[str]) -> None:
+        font = self.font
+        xy = (float(self.xy[0]), float(self.xy[1]))
+        spacing = self.spacing + self.padding[0] + self.padding[2]
+
+        # Calculate the height of all the text, and use that as the height for each
+        # individual box If we don't do this, different boxes could have different
+        # calculated heights because of ascenders/descenders.
+        _, top, _, bottom = painter.draw.textbbox(xy=xy, text=" ".join(tags), font=font)
+        height = bottom - top
+
+        for tag in tags:
+            width = painter.draw.textlength(text=tag, font=font)
+
+            if self.bg is not None:
+                bbox = (xy[0], xy[1], xy[0] + width, xy[1] + height)
+                painter.rect(_pad_box(bbox, self.padding), self.bg)
+
+            painter.text(xy, tag, font, self.fg)
+            xy = (xy[0] + width + spacing, xy[1])
+
+
+def _compile_field(field: TextFieldConfig) -> FieldPlan:
+    if field.multi:
+        return TagFieldPlan(field, _multi_value(field))
+    elif isinstance(field.source, list):
+        return TextFieldPlan(field, _multi_source_value(field))
+    else:
+        return TextFieldPlan(field, _single_source_value(field))
+
+
+def _single_source_value(
+    field: TextFieldConfig,
+) -> Callable[[Mapping[str, Any]], Optional[str]]:
     """
-    Draw a field where the `source` is a single, e.g.::
+    Get the value for a field where the `source` is a single, e.g.::
 
         [[field]]
         source = "title"
@@ -47,22 +178,30 @@ def _draw_single_source(fm: dict, im: Image.Image, field: TextFieldConfig) -> No
     assert not isinstance(field.parse, Mapping)
     assert not isinstance(field.default, Mapping)
 
-    value = get_frontmatter_value(
-        fm,
-        source=field.source,
-        default=field.default,
-        missing_ok=field.optional,
-        parser=_get_parser(field.parse),
-    )
-    if value:
-        if field.format:
-            value = field.format.format(value, **{field.source: value})
-        draw_text_field(im, str(value), field)
+    source = field.source
+    default = field.default
+    missing_ok = field.optional
+    parser = _get_parser(field.parse)
+    format = field.format
+
+    def value(fm: Mapping[str, Any]) -> Optional[str]:
+        value = get_frontmatter_value(
+            fm, source=source, default=default, missing_ok=missing_ok, parser=parser
+        )
+        if not value:
+            return None
+        if format:
+            value = format.format(value, **{source: value})
+        return str(value)
 
+    return value
 
-def _draw_multi_source(fm: dict, im: Image.Image, field: TextFieldConfig) -> None:
+
+def _multi_source_value(
+    field: TextFieldConfig,
+) -> Callable[[Mapping[str, Any]], str]:
     """
-    Draw a field which has multiple sources -- i.e.::
+    Get the value for a field which has multiple sources -- i.e.::
 
         [[field]]
         source = ["author", "title"]
@@ -92,17 +231,24 @@ def _draw_multi_source(fm: dict, im: Image.Image, field: TextFieldConfig) -> Non
     else:
         defaults = {source: field.default or "" for source in field.source}
 
+    sources = field.source
+    format = str(field.format)
     parsers = _get_parsers(field)
+    missing_ok = field.optional
+
+    def value(fm: Mapping[str, Any]) -> str:
+        return str(
+            get_frontmatter_formatted(
+                fm,
+                format=format,
+                sources=sources,
+                defaults=defaults,
+                parsers=parsers,
+                missing_ok=missing_ok,
+            )
+        )
 
-    value = get_frontmatter_formatted(
-        fm,
-        format=str(field.format),
-        sources=field.source,
-        defaults=defaults,
-        parsers=parsers,
-        missing_ok=field.optional,
-    )
-    draw_text_field(im, str(value), field)
+    return value
 
 
 def _get_parsers(field: TextFieldConfig):
@@ -120,120 +266,173 @@ def _get_parsers(field: TextFieldConfig):
     return parsers
 
 
-def _draw_multi(fm: dict, im: Image.Image, field: TextFieldConfig) -> None:
+def _multi_value(
+    field: TextFieldConfig,
+) -> Callable[[Mapping[str, Any]], List[str]]:
     """
-    Draw a multi-value field, e.g. something like "tags", where the field can
-    have multiple values that are all drawn.
+    Get the values for a multi-value field, e.g. something like "tags", where
+    the field can have multiple values that are all drawn.
 
     This is diferent from a field with multiple _sources_, see
-    `_draw_multi_source`. Sorry about the confusing name.
+    `_multi_source_value`. Sorry about the confusing name.
     """
 
     assert not isinstance(field.parse, Mapping)
+
+    source = str(field.source)
+    default = str(field.default)
+    missing_ok = field.optional
     parser = _get_parser(field.parse)
+    format = field.format
 
-    values = get_frontmatter_list(
-        fm,
-        source=str(field.source),
-        default=str(field.default),
-        missing_ok=field.optional,
-        parser=parser,
-    )
-    if field.format:
-        values = [field.format.format(v, **{str(field.source): v}) for v in values]
-    draw_tag_field(im, values, field)
+    def value(fm: Mapping[str, Any]) -> List[str]:
+        values = get_frontmatter_list(
+            fm, source=source, default=default, missing_ok=missing_ok, parser=parser
+        )
+        if format:
+            values = [format.format(v, **{source: v}) for v in values]
+        return values
 
+    return value
 
-def draw_text_field(im: Image.Image, text: str, field: TextFieldConfig) -> None:
-    font = load_font(str(field.font), field.font_size)
 
-    if field.wrap:
-        max_width = field.max_width if field.max_width else im.width - field.x
-        text = wrap_font_text(font, text, max_width)
+def draw_text_field(
+    im: Union[Image.Image, "Painter"], text: str, field: TextFieldConfig
+) -> None:
+    painter = im if isinstance(im, Painter) else Painter(im)
+    TextFieldPlan(field, lambda fm: text).paint(painter, text)
 
-    draw = ImageDraw.Draw(im, mode="RGBA")
 
-    if field.bg:
-        assert isinstance(field.padding, PaddingConfig)  # for mypy
-        _draw_rect(
-            im=im,
-            bbox=draw.textbbox(xy=(field.x, field.y), text=text, font=font),
-            padding=field.padding,
-            color=field.bg,
-        )
+def draw_tag_field(
+    im: Union[Image.Image, "Painter"], tags: List[str], field: TextFieldConfig
+) -> None:
+    painter = im if isinstance(im, Painter) else Painter(im)
+    TagFieldPlan(field, lambda fm: tags).paint(painter, tags)
 
-    assert isinstance(field.fg, Color)  # for mypy
-    draw.text(xy=(field.x, field.y), text=text, font=font, fill=to_pil_color(field.fg))
 
+Box = Tuple[float, float, float, float]
 
-def draw_tag_field(im: Image.Image, tags: List[str], field: TextFieldConfig) -> None:
-    assert isinstance(field.padding, PaddingConfig)  # for mypy
 
-    font = load_font(str(field.font), field.font_size)
+class Painter:
+    """
+    Draws background rectangles and text onto a card as fields ask for them.
+    """
 
-    draw = ImageDraw.Draw(im)
-    xy = (float(field.x), float(field.y))
-    spacing = field.spacing + field.padding.left + field.padding.right
+    def __init__(self, im: Image.Image) -> None:
+        self.im = im
+        self.draw = ImageDraw.Draw(im, mode="RGBA")
 
-    # Calculate the height of all the text, and use that as the height for each
-    # individual box If we don't do this, different boxes could have different
-    # calculated heights because of ascenders/descenders.
-    _, top, _, bottom = draw.textbbox(xy=xy, text=" ".join(tags), font=font)
-    height = bottom - top
+    def rect(self, box: Box, fill: "PILColorTuple") -> None:
+        with stage("rects"):
+            _composite_rects(self.im, [(box, fill)])
 
-    for tag in tags:
-        width = draw.textlength(text=tag, font=font)
+    def text(
+        self, xy: Tuple[float, float], text: str, font: FontType, fill: "PILColorTuple"
+    ) -> None:
+        with stage("text"):
+            self.draw.text(xy=xy, text=text, font=font, fill=fill)
+
+    def flush(self) -> None:
+        pass
 
-        if field.bg:
-            _draw_rect(
-                im=im,
-                bbox=(xy[0], xy[1], xy[0] + width, xy[1] + height),
-                padding=field.padding,
-                color=field.bg,
-            )
 
-        assert isinstance(field.fg, Color)
-        draw.text(xy=xy, text=tag, font=font, fill=to_pil_color(field.fg))
-        xy = (xy[0] + width + spacing, xy[1])
+class BatchPainter(Painter):
+    """
+    Holds on to all of a card's background rectangles and text until `flush()`,
+    then composites every rectangle in one go before drawing any text. This is
+    the `batch_compositing` option.
+
+    That's only the same as drawing each field in turn as long as rectangles
+    don't overlap each other, or the text of fields drawn before them.
+    """
+
+    def __init__(self, im: Image.Image) -> None:
+        super().__init__(im)
+        self.rects: List[Tuple[Box, PILColorTuple]] = []
+        self.texts: List[Tuple[Tuple[float, float], str, FontType, PILColorTuple]] = []
+
+    def rect(self, box: Box, fill: "PILColorTuple") -> None:
+        self.rects.append((box, fill))
+
+    def text(
+        self, xy: Tuple[float, float], text: str, font: FontType, fill: "PILColorTuple"
+    ) -> None:
+        self.texts.append((xy, text, font, fill))
+
+    def flush(self) -> None:
+        with stage("rects"):
+            _composite_rects(self.im, self.rects)
+        for xy, text, font, fill in self.texts:
+            super().text(xy, text, font, fill)
+        self.rects = []
+        self.texts = []
+
+
+def _pad_box(bbox: Box, padding: Padding) -> Box:
+    """
+    Expand a bounding box to account for padding
+    """
+    x0, y0, x1, y1 = bbox
+    left, top, right, bottom = padding
+    return (x0 - left, y0 - top, x1 + right, y1 + bottom)
 
 
 def _draw_rect(
     im: Image.Image,
-    bbox: Tuple[float, float, float, float],
+    bbox: Box,
     padding: PaddingConfig,
     color: Color,
 ):
-    x0, y0, x1, y1 = bbox
+    p = (padding.left, padding.top, padding.right, padding.bottom)
+    _composite_rects(im, [(_pad_box(bbox, p), to_pil_color(color))])
 
-    # expand the bounding box to account for padding
-    x0 -= padding.left
-    y0 -= padding.top
-    x1 += padding.right
-    y1 += padding.bottom
-
-    # When drawing with any transparancy, just drawing directly on to
-    # the background image doesn't actually do compositing, you just get
-    # a semi-transparant "cutout" of the background. To work around this,
-    # draw into a temporary image and then composite it.
-    overlay = Image.new(mode="RGBA", size=im.size, color=(0, 0, 0, 0))
-    draw = ImageDraw.Draw(overlay)
-    draw.rectangle(
-        xy=(x0, y0, x1, y1),
-        fill=to_pil_color(color),
+
+def _composite_rects(im: Image.Image, rects: List[Tuple[Box, "PILColorTuple"]]):
+    """
+    Draw (possibly translucent) filled rectangles onto `im`.
+
+    When drawing with any transparancy, just drawing directly on to the
+    background image doesn't actually do compositing, you just get a
+    semi-transparant "cutout" of the background. To work around this, draw into
+    a temporary image and then composite it.
+
+    The temporary image only needs to cover the rectangles (clipped to the
+    image), not the whole image. Pillow includes both edges of a rectangle,
+    hence the +1s; and offsetting by whole pixels means rectangles are
+    rasterized exactly as they would be on a full-size overlay.
+    """
+    if not rects:
+        return
+
+    left = max(0, math.floor(min(box[0] for box, _ in rects)))
+    top = max(0, math.floor(min(box[1] for box, _ in rects)))
+    right = min(im.width, math.ceil(max(box[2] for box, _ in rects)) + 1)
+    bottom = min(im.height, math.ceil(max(box[3] for box, _ in rects)) + 1)
+    if right <= left or bottom <= top:
+        return
+
+    overlay = Image.new(
+        mode="RGBA", size=(right - left, bottom - top), color=(0, 0, 0, 0)
     )
-    im.alpha_composite(overlay)
+    draw = ImageDraw.Draw(overlay)
+    for (x0, y0, x1, y1), fill in rects:
+        draw.rectangle(xy=(x0 - left, y0 - top, x1 - left, y1 - top), fill=fill)
+    im.alpha_composite(overlay, dest=(left, top))
+
+
+# Only used for its chunk-splitting, which doesn't depend on any of its settings
+_wrapper = TextWrapper()
 
 
 def wrap_font_text(font: FontType, text: str, max_width: int) -> str:
-    wrapper = TextWrapper()
-    chunks = wrapper._split_chunks(text)
+    chunks = _wrapper._split_chunks(text)
 
     lines: List[List[str]] = []
     cur_line: List[str] = []
     cur_line_width = 0
 
     for chunk in chunks:
-        width = int(font.getlength(chunk))
+        width = _chunk_width(font, chunk)
 
         # If this chunk makes our line too long...
         if cur_line_width + width > max_width:
@@ -259,17 +458,82 @@ def wrap_font_text(font: FontType, text: str, max_width: int) -> str:
     return "\n".join("".join(line).strip() for line in lines).strip()
 
 
+# How many chunk (word, space, etc.) widths to remember, across all fonts.
+CHUNK_WIDTH_CACHE_SIZE = 16384
+
+
+@functools.lru_cache(maxsize=CHUNK_WIDTH_CACHE_SIZE)
+def _chunk_width(font: FontType, chunk: str) -> int:
+    """
+    Measure a chunk of text. The same words (and spaces) come up over and over
+    again across cards, and fonts are cached by load_font, so it's worth
+    remembering the results.
+    """
+    return int(font.getlength(chunk))
+
+
+def clear_font_caches() -> None:
+    """
+    Forget loaded fonts, and text measured with them; e.g. when font files have
+    changed.
+    """
+    _load_font.cache_clear()
+    _chunk_width.cache_clear()
+
+
+# Decoded template images, keyed by path, along with the mtime of the file when
+# it was decoded. Templates are usually shared by every card in a run, so this
+# means each process only decodes (and converts) them once.
+_templates: Dict[str, Tuple[int, Image.Image]] = {}
+
+
+def load_template(path: Union[str, Path]) -> Image.Image:
+    """
+    Return a fresh copy of the template image, decoding it only if it hasn't
+    been seen before or the file has changed since.
+    """
+    key = str(path)
+    mtime = os.stat(key).st_mtime_ns
+    cached = _templates.get(key)
+    if cached is None or cached[0] != mtime:
+        with Image.open(key) as im:
+            im.load()
+            # Fields are drawn with RGB(A) colors, so palette, greyscale, etc.
+            # templates need converting first.
+            template = im if im.mode in ("RGB", "RGBA") else im.convert("RGBA")
+        cached = _templates[key] = (mtime, template)
+    return cached[1].copy()
+
+
 # This is an injection point for tests, so they can force the use of the same
 # layout engine, otherwise tests fail when libraqm is installed.
 LAYOUT_ENGINE = None
 
 
+# How many fonts (distinct path/size/engine combinations) to keep loaded.
+FONT_CACHE_SIZE = 64
+
+
 def load_font(font: str, size: float) -> FontType:
+    return _load_font(font, float(size), LAYOUT_ENGINE)
+
+
+@functools.lru_cache(maxsize=FONT_CACHE_SIZE)
+def _load_font(
+    font: str, size: float, layout_engine: Optional[ImageFont.Layout]
+) -> FontType:
     # Work around some type signature mismatches between my API and Pillow's
     if font == DEFAULT_FONT:
         return ImageFont.load_default()
     else:
-        return ImageFont.truetype(font, float(size), layout_engine=LAYOUT_ENGINE)
+        return ImageFont.truetype(font, size, layout_engine=layout_engine)
+
+
+def font_cache_info() -> "functools._CacheInfo":
+    """
+    Hit/miss statistics for the font cache used by `load_font`.
+    """
+    return _load_font.cache_info()
 
 
 PILColorTuple = Union[Tuple[int, int, int], Tuple[int, int, int, int]]
@@ -293,4 +557,4 @@ def to_pil_color(color: Color) -> PILColorTuple:
 
 
 def _get_parser(name: Optional[ParserOptions]) -> Optional[ParserCallback]:
-    return dateutil.parser.parse if name == "datetime" else None
+    return parse_datetime if name == "datetime" else None
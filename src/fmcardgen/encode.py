@@ -0,0 +1,123 @@
+"""
+Encoding cards to image files: picking the format and the encoder's speed/size
+trade-offs, from the `encoding` section of the config.
+"""
+
+import io
+import os
+from typing import Any, Dict, Optional
+
+from PIL import Image, ImageChops, ImageStat
+
+from .config import EncodingConfig, EncodingPreset, ImageFormat
+from .store import replacing
+
+# Output extensions we know how to tune the encoder for. Anything else is left
+# to Pillow, with its default settings.
+EXTENSIONS: Dict[str, ImageFormat] = {
+    ".png": "png",
+    ".webp": "webp",
+    ".jpg": "jpeg",
+    ".jpeg": "jpeg",
+    ".avif": "avif",
+}
+
+CONTENT_TYPES: Dict[ImageFormat, str] = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+    "avif": "image/avif",
+}
+
+# Encoder options for each preset. "default" is whatever Pillow does; "fast"
+# favours encode speed over bytes, and "small" the other way round.
+PRESETS: Dict[EncodingPreset, Dict[ImageFormat, Dict[str, Any]]] = {
+    "default": {},
+    "fast": {
+        "png": {"compress_level": 1},
+        "webp": {"quality": 80, "method": 0},
+        "jpeg": {"quality": 85},
+        "avif": {"quality": 70, "speed": 10},
+    },
+    "small": {
+        "png": {"compress_level": 9},
+        "webp": {"quality": 75, "method": 6},
+        "jpeg": {"quality": 75, "optimize": True, "progressive": True},
+        "avif": {"quality": 60, "speed": 4},
+    },
+}
+
+
+class Encoder:
+    """
+    Saves (or encodes) cards as configured by an `EncodingConfig`.
+
+    The format is `config.format` if that's set, otherwise it's inferred from
+    the output file's extension. With `config.palette`, PNGs are quantized to
+    a palette first (see `quantize`).
+
+    Nothing that varies between runs (like a timestamp) is written into the
+    file, so the same card always encodes to the same bytes.
+    """
+
+    def __init__(self, config: EncodingConfig) -> None:
+        self.config = config
+
+    def format_for(self, dest: str) -> Optional[ImageFormat]:
+        if self.config.format is not None:
+            return self.config.format
+        return EXTENSIONS.get(os.path.splitext(dest)[1].lower())
+
+    def options(self, fmt: Optional[ImageFormat]) -> Dict[str, Any]:
+        if fmt is None:
+            return {}
+        options = dict(PRESETS[self.config.preset].get(fmt, {}))
+        if fmt == "png":
+            if self.config.compress_level is not None:
+                options["compress_level"] = self.config.compress_level
+        elif self.config.quality is not None:
+            options["quality"] = self.config.quality
+        return options
+
+    def save(self, im: Image.Image, dest: str) -> None:
+        fmt = self.format_for(dest)
+        with replacing(dest) as tmp:
+            self.prepare(im, fmt).save(tmp, format=fmt, **self.options(fmt))
+
+    def encode(self, im: Image.Image, fmt: ImageFormat) -> bytes:
+        buf = io.BytesIO()
+        self.prepare(im, fmt).save(buf, format=fmt, **self.options(fmt))
+        return buf.getvalue()
+
+    def prepare(self, im: Image.Image, fmt: Optional[ImageFormat]) -> Image.Image:
+        if fmt == "png" and self.config.palette:
+            return quantize(im, self.config.max_colors, self.config.max_palette_error)
+        # JPEG has no alpha channel
+        if fmt == "jpeg" and im.mode != "RGB":
+            return im.convert("RGB")
+        return im
+
+
+def quantize(
+    im: Image.Image, max_colors: int = 256, max_error: float = 4.0
+) -> Image.Image:
+    """
+    Reduce a card to a palette ("P" mode) image of at most `max_colors` colours,
+    which makes for a much smaller PNG.
+
+    Cards that don't quantize well -- where the RMS difference from the
+    original, in any channel, is more than `max_error` -- are returned as-is.
+    """
+    if im.mode == "RGBA" and im.getchannel("A").getextrema() == (255, 255):
+        # Fully opaque, so the palette doesn't need to spend entries on alpha
+        source = im.convert("RGB")
+    elif im.mode in ("RGB", "RGBA"):
+        source = im
+    else:
+        return im
+
+    quantized = source.quantize(max_colors, method=Image.Quantize.FASTOCTREE)
+    diff = ImageChops.difference(quantized.convert(source.mode), source)
+    if max(ImageStat.Stat(diff).rms) > max_error:
+        return im
+    return quantized
@@ -1,8 +1,57 @@
-from typing import Dict, Optional, List, Mapping, Any, Callable
+import datetime
+import functools
+import re
+from pathlib import Path
+from typing import Dict, Optional, List, Mapping, Any, Callable, Union
+
+import frontmatter
 
 ParserCallback = Callable[[str], Any]
 
 
+def read_frontmatter(path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Read just the frontmatter from a post, stopping at the closing delimiter
+    rather than reading (and decoding) the whole file like `frontmatter.parse`.
+
+    Handles the same formats, and gives the same results, as `frontmatter.parse`:
+    YAML (between `---` lines), TOML (`+++`), or JSON (`{` and `}`).
+    """
+    # Read in binary and decode line by line, so that nothing past the
+    # frontmatter gets decoded (or even read, beyond the first buffer-full).
+    with open(path, "rb") as f:
+        lines = (raw.decode("utf-8").replace("\r\n", "\n") for raw in f)
+
+        # The opening delimiter is the first non-blank line
+        for first in lines:
+            if first.strip():
+                break
+        else:
+            return {}
+
+        for handler in frontmatter.handlers:
+            assert handler.FM_BOUNDARY is not None
+            if handler.FM_BOUNDARY.match(first.lstrip()):
+                break
+        else:
+            return {}
+
+        fm_lines = []
+        for line in lines:
+            if handler.FM_BOUNDARY.match(line):
+                break
+            fm_lines.append(line)
+        else:
+            # no closing delimiter, so no frontmatter
+            return {}
+
+    fm = "".join(fm_lines)
+    if isinstance(handler, frontmatter.JSONHandler):
+        fm = "{" + fm + "}"
+    metadata = handler.load(fm)
+    return metadata if isinstance(metadata, dict) else {}
+
+
 def get_frontmatter_value(
     fm: Mapping[str, Any],
     source: str,
@@ -64,3 +113,44 @@ def get_frontmatter_formatted(
         for source in sources
     }
     return format.format(**values)
+
+
+# Dates and times that datetime.fromisoformat() parses exactly the same as
+# dateutil does, on every Python version we support. Anything else (including
+# UTC offsets, since dateutil represents those differently) goes to dateutil.
+_ISO_DATETIME = re.compile(
+    r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{3}|\.\d{6})?)?)?"
+)
+
+
+def parse_datetime(value: Any) -> datetime.datetime:
+    """
+    Parse a frontmatter value into a datetime; this is `parse = "datetime"`.
+
+    Dates that YAML/TOML have already parsed are used as-is. Strings are parsed
+    with `dateutil.parser.parse`, but ISO-8601 dates -- which are almost all of
+    them, in practice -- take a much faster path. Results are cached, since
+    lots of posts tend to share dates.
+    """
+    if isinstance(value, datetime.datetime):
+        return value
+    elif isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day)
+    elif isinstance(value, str):
+        return _parse_datetime_str(value)
+    else:
+        return _dateutil_parse(value)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_datetime_str(value: str) -> datetime.datetime:
+    if _ISO_DATETIME.fullmatch(value):
+        return datetime.datetime.fromisoformat(value)
+    return _dateutil_parse(value)
+
+
+def _dateutil_parse(value: Any) -> datetime.datetime:
+    # dateutil is slow to import, and only needed for dates that aren't ISO
+    import dateutil.parser
+
+    return dateutil.parser.parse(value)
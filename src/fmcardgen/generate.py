@@ -0,0 +1,225 @@
+"""
+Generating cards for posts: finding posts, and turning each one into a card on
+disk.
+"""
+
+import threading
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Union
+
+from PIL import Image
+
+from .config import CardGenConfig
+from .dependencies import Dependencies, used_keys
+from .frontmatter import read_frontmatter
+from .manifest import Stamp, stamp
+from .profile import Profile, profiling, stage
+from .renderer import CardRenderer
+from .store import CardStore
+from .walk import walk_posts
+
+
+def find_posts(
+    posts: List[Path],
+    ext: List[str],
+    ignore: List[str],
+    gitignore: bool,
+    walked: Optional[List[Path]] = None,
+) -> Iterator[Path]:
+    """
+    Expand the posts given on the command line: directories are walked (see
+    `walk_posts`, which adds each directory it scans to `walked`) and files are
+    passed through as-is.
+    """
+    for post in posts:
+        if post.is_dir():
+            yield from walk_posts(post, ext, ignore, gitignore, walked)
+        else:
+            yield post
+
+
+class GenerateResult(NamedTuple):
+    post: Path
+    dest: Optional[str] = None
+    error: Optional[str] = None
+    digest: Optional[str] = None
+    unchanged: bool = False
+    reused: bool = False
+    profile: Optional[Profile] = None
+    # the post's mtime and size from just before it was read, with a manifest
+    stamp: Optional[Stamp] = None
+
+
+class PendingCard(NamedTuple):
+    """
+    A post that's been read, and whose card needs drawing.
+    """
+
+    post: Path
+    fm: dict
+    dest: str
+    # see GenerateResult.digest
+    digest: Optional[str]
+    # the digest the card is stored under, if there's a store
+    card: Optional[str]
+    # see GenerateResult.stamp
+    stamp: Optional[Stamp] = None
+
+
+def error_result(post: Path, e: Exception) -> GenerateResult:
+    return GenerateResult(post, error=f"{type(e).__name__}: {e}")
+
+
+class Generator:
+    """
+    Generates the card for a post. Pool workers each get a copy of this at
+    startup, rather than having the config re-pickled for every post; threads
+    share one, and its renderer.
+
+    If `config_digest` is given, each result carries the digest of its card's
+    inputs and destination (see `dependencies.Dependencies`), and posts whose
+    digest matches the one they're called with aren't re-rendered.
+
+    If `store` is given, posts whose card would be identical to one that's
+    already been made -- because the frontmatter it shows is the same -- get a
+    copy of that card rather than drawing it again.
+
+    If `profile` is true, each result carries a profile of where the time went.
+    """
+
+    def __init__(
+        self,
+        config: CardGenConfig,
+        output: str,
+        config_digest: Optional[str] = None,
+        profile: bool = False,
+        store: Optional[CardStore] = None,
+    ) -> None:
+        self.config = config
+        self.output = output
+        self.config_digest = config_digest
+        self.profile = profile
+        self.store = store
+        self.dependencies = (
+            Dependencies(config_digest, used_keys(config, output))
+            if config_digest is not None
+            else None
+        )
+        # What a card looks like doesn't depend on where it's written
+        self.card_dependencies = Dependencies.of_cards(config) if store else None
+        self._renderer: Optional[CardRenderer] = None
+        self._renderer_lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # Fonts can't be pickled, so each worker process makes its own renderer
+        state = self.__dict__.copy()
+        state["_renderer"] = None
+        del state["_renderer_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._renderer_lock = threading.Lock()
+
+    @property
+    def renderer(self) -> CardRenderer:
+        # so that threads rendering the first few cards don't each compile one
+        with self._renderer_lock:
+            if self._renderer is None:
+                with stage("compile"):
+                    self._renderer = CardRenderer(self.config)
+            return self._renderer
+
+    def __call__(
+        self, post: Path, previous_digest: Optional[str] = None
+    ) -> GenerateResult:
+        """
+        Generate a card, turning errors into a result so that one bad post doesn't
+        stop the rest of the run.
+        """
+        if not self.profile:
+            return self._generate(post, previous_digest)
+        with profiling() as profile:
+            result = self._generate(post, previous_digest)
+        return result._replace(profile=profile)
+
+    def _generate(self, post: Path, previous_digest: Optional[str]) -> GenerateResult:
+        try:
+            return self.generate(post, previous_digest)
+        except Exception as e:
+            return error_result(post, e)
+
+    def generate(
+        self, post: Path, previous_digest: Optional[str] = None
+    ) -> GenerateResult:
+        pending = self.read(post, previous_digest)
+        if isinstance(pending, GenerateResult):
+            return pending
+        return self.write(pending, self.draw(pending))
+
+    # Generating a card, in the stages a `pipeline.Pipeline` runs separately:
+
+    def read(
+        self, post: Path, previous_digest: Optional[str] = None
+    ) -> Union[GenerateResult, PendingCard]:
+        """
+        Read a post, and work out whether it needs drawing at all: returns the
+        result straight away if its card is unchanged or can be reused.
+        """
+        # Stamped before it's read, so an edit made while the card is being
+        # generated isn't taken to be in the card
+        post_stamp = stamp(post) if self.dependencies is not None else None
+        with stage("parse"):
+            fm = read_frontmatter(post)
+        dest = self.destination(post, fm)
+
+        digest = None
+        if self.dependencies is not None:
+            with stage("digest"):
+                digest = self.dependencies.digest(fm)
+            if digest == previous_digest:
+                return GenerateResult(
+                    post, dest, digest=digest, unchanged=True, stamp=post_stamp
+                )
+
+        card = None
+        if self.store is not None:
+            assert self.card_dependencies is not None
+            with stage("reuse"):
+                card = self.card_dependencies.digest(fm)
+                if self.store.get(card, dest):
+                    return GenerateResult(
+                        post, dest, digest=digest, reused=True, stamp=post_stamp
+                    )
+
+        return PendingCard(post, fm, dest, digest, card, post_stamp)
+
+    def draw(self, pending: PendingCard) -> Image.Image:
+        renderer = self.renderer
+        with stage("draw"):
+            return renderer.render(pending.fm)
+
+    def write(self, pending: PendingCard, im: Image.Image) -> GenerateResult:
+        """
+        Encode and save a drawn card.
+        """
+        with stage("save"):
+            self.renderer.encoder.save(im, pending.dest)
+        if self.store is not None:
+            assert pending.card is not None
+            self.store.put(pending.card, pending.dest)
+        return GenerateResult(
+            pending.post, pending.dest, digest=pending.digest, stamp=pending.stamp
+        )
+
+    def destination(self, post: Path, fm: dict) -> str:
+        # handle Hugo-style bundles -- bundle/index.md or bundle/_index.md --
+        # by using the parent directory name, if relevant
+        if post.stem in ("index", "_index"):
+            file_name = post.parent.name
+            file_stem = post.parent.stem
+        else:
+            file_name = post.name
+            file_stem = post.stem
+
+        return self.output.format(**dict(fm, file_name=file_name, file_stem=file_stem))
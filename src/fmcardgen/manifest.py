@@ -0,0 +1,107 @@
+"""
+A persistent record of the cards generated by previous runs, so that a rebuild
+only re-renders the posts whose cards would actually change.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+MANIFEST_VERSION = 2
+
+# A file's mtime and size: if neither has changed, nor (we assume) has the file
+Stamp = Tuple[int, int]
+
+
+def stamp(path: Union[str, Path]) -> Optional[Stamp]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class Manifest:
+    """
+    Maps post paths to what we knew about them when their card was last
+    generated: the post file's mtime and size, the digest of the card's inputs
+    (see `dependencies.Dependencies.digest`), and where the card was written,
+    and its mtime and size (so a card that's since been changed or replaced by
+    something else gets generated again).
+    """
+
+    def __init__(self, path: Path, entries: Optional[Dict[str, Dict]] = None) -> None:
+        self.path = path
+        self.entries = {} if entries is None else entries
+
+    @classmethod
+    def load(cls, path: Path) -> Manifest:
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return cls(path)
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, data["posts"])
+
+    def save(self) -> None:
+        # write then rename, so an interrupted run can't leave a corrupt manifest
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(
+            json.dumps({"version": MANIFEST_VERSION, "posts": self.entries}, indent=1)
+        )
+        os.replace(tmp, self.path)
+
+    def is_unchanged(self, post: Path, config_digest: str) -> bool:
+        """
+        Cheap check, without reading the post: has the file been touched, or the
+        config changed, since the card was generated?
+        """
+        entry = self.entries.get(str(post))
+        if entry is None or entry["config"] != config_digest:
+            return False
+        post_unchanged = stamp(post) == (entry["mtime_ns"], entry["size"])
+        return post_unchanged and self._card_is_unchanged(entry)
+
+    def previous_digest(self, post: Path) -> Optional[str]:
+        entry = self.entries.get(str(post))
+        if entry is None or not self._card_is_unchanged(entry):
+            return None
+        return entry["digest"]
+
+    def _card_is_unchanged(self, entry: Dict) -> bool:
+        return stamp(entry["dest"]) == (entry["dest_mtime_ns"], entry["dest_size"])
+
+    def record(
+        self,
+        post: Path,
+        config_digest: str,
+        digest: str,
+        dest: str,
+        post_stamp: Stamp,
+    ) -> None:
+        """
+        Record a post's card. `post_stamp` should be taken before the post is
+        read, so that if it's edited while its card is generated, the card
+        doesn't count as up to date with the edit.
+        """
+        dest_stamp = stamp(dest)
+        if dest_stamp is None:
+            # something's removed it already; generate it again next time
+            self.forget(post)
+            return
+        self.entries[str(post)] = {
+            "mtime_ns": post_stamp[0],
+            "size": post_stamp[1],
+            "config": config_digest,
+            "digest": digest,
+            "dest": dest,
+            "dest_mtime_ns": dest_stamp[0],
+            "dest_size": dest_stamp[1],
+        }
+
+    def forget(self, post: Path) -> None:
+        self.entries.pop(str(post), None)
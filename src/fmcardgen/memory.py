@@ -0,0 +1,146 @@
+"""
+Keeping a run within a memory budget, for `fmcardgen --max-memory`.
+
+Beyond the interpreter and its libraries, a run's memory goes almost entirely
+on cards that are being drawn: each is a full-size RGBA image, plus up to a
+couple more of the same size while it's composited and encoded. So a budget
+comes down to how many cards can be in flight at once, which limits the
+number of workers (and, in a pipeline, how many drawn cards can queue up).
+"""
+
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+try:
+    import resource
+except ImportError:  # pragma: no cover (Windows)
+    resource = None  # type: ignore[assignment]
+
+MiB = 2**20
+
+_STATM = "/proc/self/statm"
+
+# What a run takes before it's drawn anything -- the interpreter, pydantic,
+# Pillow and fonts -- and what each extra worker process takes, rounded up
+# from what they measure at (see `python -m benchmarks.concurrency`).
+PROCESS_OVERHEAD = 64 * MiB
+WORKER_OVERHEAD = 48 * MiB
+
+# A card being drawn is the card itself, plus at most a full-size overlay
+# (see `draw._composite_rects`), or a converted or quantized copy while it's
+# being encoded, plus the encoder's buffers.
+CARD_COPIES = 3
+
+_SIZE = re.compile(r"(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?", re.IGNORECASE)
+_UNITS = {"": 1, "k": 2**10, "m": 2**20, "g": 2**30, "t": 2**40}
+
+
+def parse_size(text: str) -> int:
+    """
+    Parse a size in bytes, with an optional (binary) unit: "2G", "512MiB",
+    "1.5gb", "100000".
+    """
+    match = _SIZE.fullmatch(text.strip())
+    if match is None:
+        raise ValueError(f"{text!r} isn't a size, like 512M or 2G")
+    number, unit = match.groups()
+    return int(float(number) * _UNITS[unit.lower()])
+
+
+def format_size(size: int) -> str:
+    return f"{size / MiB:.0f}MiB"
+
+
+def card_bytes(template: Union[str, Path]) -> int:
+    """
+    About how much memory drawing one card on `template` takes.
+    """
+    from PIL import Image
+
+    # Opening an image only reads its header
+    with Image.open(template) as im:
+        width, height = im.size
+    return width * height * 4 * CARD_COPIES
+
+
+def current_rss() -> Optional[int]:
+    """
+    This process's resident memory, in bytes: where /proc isn't available, its
+    peak resident memory so far instead, or None if that isn't either.
+    """
+    try:
+        with open(_STATM) as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes everywhere else
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryBudgetError(ValueError):
+    pass
+
+
+class MemoryBudget:
+    """
+    Fits the ways of running a batch of cards into `limit` bytes, given that
+    each card in flight takes `card_bytes`.
+    """
+
+    def __init__(self, limit: int, card_bytes: int) -> None:
+        self.limit = limit
+        self.card_bytes = card_bytes
+
+    def cards(self, per_card: int = 0) -> int:
+        """
+        How many cards fit in the budget at once, if each also needs `per_card`
+        bytes besides itself (e.g. a worker process to draw it in).
+        """
+        return max(0, (self.limit - PROCESS_OVERHEAD) // (self.card_bytes + per_card))
+
+    def processes(self, requested: int) -> int:
+        """
+        How many of `requested` worker processes fit. Rendering in this process
+        (i.e. one "process") only needs room for one card.
+        """
+        processes = min(requested, self.cards(WORKER_OVERHEAD))
+        if processes > 1:
+            return processes
+        self._need(1)
+        return 1
+
+    def threads(self, requested: int) -> int:
+        """
+        How many of `requested` threads fit; each draws one card at a time.
+        """
+        self._need(1)
+        return min(requested, self.cards())
+
+    def pipeline(
+        self, renderers: int, writers: int, queue_size: int
+    ) -> Tuple[int, int, int]:
+        """
+        Shrink a pipeline's stages to fit, since up to `renderers + queue_size +
+        writers` drawn cards can be in flight: the queue first, then writers,
+        then renderers. Returns the new `(renderers, writers, queue_size)`.
+        """
+        self._need(3)
+        available = self.cards()
+        queue_size = max(1, min(queue_size, available - renderers - writers))
+        writers = max(1, min(writers, available - renderers - queue_size))
+        renderers = max(1, min(renderers, available - writers - queue_size))
+        return renderers, writers, queue_size
+
+    def _need(self, cards: int) -> None:
+        if self.cards() < cards:
+            needed = PROCESS_OVERHEAD + cards * self.card_bytes
+            raise MemoryBudgetError(
+                f"a memory budget of {format_size(self.limit)} is too small: "
+                f"this needs at least {format_size(needed)}"
+            )
@@ -0,0 +1,202 @@
+"""
+Generating cards as a pipeline, for `fmcardgen --pipeline`: posts are read,
+drawn, and encoded and written by separate stages, each with its own threads,
+so that (say) one card is being written while the next is drawn and the one
+after that is read. Throughput then tends towards that of the slowest stage,
+rather than the sum of all of them, which matters most when writes are slow
+(e.g. to a network filesystem).
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+from .generate import GenerateResult, Generator, PendingCard, error_result
+from .profile import Profile, Span, profiling
+
+Job = Tuple[Path, Optional[str]]
+
+
+class _Item:
+    """
+    A post on its way through the pipeline.
+    """
+
+    __slots__ = ("post", "previous_digest", "result", "pending", "im", "spans")
+
+    def __init__(self, post: Path, previous_digest: Optional[str]) -> None:
+        self.post = post
+        self.previous_digest = previous_digest
+        self.result: Future = Future()
+        self.pending: Optional[PendingCard] = None
+        self.im: Optional[Image.Image] = None
+        self.spans: List[Span] = []
+
+    def finish(self, result: GenerateResult, profile: bool) -> None:
+        self.im = None
+        if profile:
+            profiled = Profile(os.getpid(), threading.get_ident(), self.spans)
+            result = result._replace(profile=profiled)
+        self.result.set_result(result)
+
+
+# Stages are shut down by putting a None in their queue for each thread
+ItemQueue = queue.Queue[Optional[_Item]]
+
+# What a stage does with each item: returns the post's result if it's finished,
+# or None to pass it on to the next stage.
+Step = Callable[[_Item], Optional[GenerateResult]]
+
+
+class Pipeline:
+    """
+    Runs a `Generator` in three stages -- reading posts, drawing cards, and
+    encoding and writing them -- with `readers`, `renderers` and `writers`
+    threads respectively. Posts whose cards don't need drawing (because
+    they're unchanged, or reused) finish after the first stage.
+
+    Each stage hands posts to the next through a queue of at most `queue_size`
+    posts. When a stage falls behind, the queue in front of it fills up, and
+    the stages before it wait (backpressure), so memory use stays flat however
+    many posts there are: at most `window` posts are in flight at once, and at
+    most `renderers + queue_size + writers` drawn cards are held in memory.
+    """
+
+    def __init__(
+        self,
+        generator: Generator,
+        readers: int = 1,
+        renderers: int = 1,
+        writers: int = 1,
+        queue_size: int = 4,
+    ) -> None:
+        self.generator = generator
+        self.readers = readers
+        self.renderers = renderers
+        self.writers = writers
+        self.queue_size = queue_size
+        self.window = readers + renderers + writers + 3 * queue_size
+
+    def run(self, jobs: Iterable[Job]) -> Iterator[GenerateResult]:
+        """
+        Generate a card for each job, yielding results in the same order as
+        `jobs`.
+        """
+        # Results, in order, for the consumer; bounding this is what bounds the
+        # number of posts in flight
+        results: ItemQueue = queue.Queue(self.window)
+        errors: List[BaseException] = []
+
+        steps = [
+            ("read", self.readers, self._read),
+            ("draw", self.renderers, self._draw),
+            ("write", self.writers, self._write),
+        ]
+        inboxes: List[ItemQueue] = [queue.Queue(self.queue_size) for _ in steps]
+        outboxes: List[Optional[ItemQueue]] = [*inboxes[1:], None]
+        stages = [
+            (self._start(name, count, step, inbox, outbox), inbox)
+            for (name, count, step), inbox, outbox in zip(steps, inboxes, outboxes)
+        ]
+        to_read = inboxes[0]
+
+        def feed() -> None:
+            try:
+                for post, previous_digest in jobs:
+                    item = _Item(post, previous_digest)
+                    results.put(item)
+                    to_read.put(item)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                # Shut the stages down in order, once each has emptied
+                for threads, inbox in stages:
+                    for _ in threads:
+                        inbox.put(None)
+                    for thread in threads:
+                        thread.join()
+                results.put(None)
+
+        threading.Thread(target=feed, name="fmcardgen-feed", daemon=True).start()
+        while True:
+            item = results.get()
+            if item is None:
+                break
+            yield item.result.result()
+        if errors:
+            raise errors[0]
+
+    def _start(
+        self,
+        name: str,
+        count: int,
+        step: Step,
+        inbox: ItemQueue,
+        outbox: Optional[ItemQueue],
+    ) -> List[threading.Thread]:
+        threads = [
+            threading.Thread(
+                target=self._work,
+                args=(step, inbox, outbox),
+                name=f"fmcardgen-{name}-{i}",
+                daemon=True,
+            )
+            for i in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _work(
+        self,
+        step: Step,
+        inbox: ItemQueue,
+        outbox: Optional[ItemQueue],
+    ) -> None:
+        while True:
+            item = inbox.get()
+            if item is None:
+                return
+            try:
+                with self._profiling(item):
+                    result = step(item)
+            except Exception as e:
+                result = error_result(item.post, e)
+            if result is not None:
+                item.finish(result, self.generator.profile)
+            else:
+                assert outbox is not None
+                outbox.put(item)
+
+    @contextmanager
+    def _profiling(self, item: _Item) -> Iterator[None]:
+        if not self.generator.profile:
+            yield
+            return
+        with profiling() as profile:
+            try:
+                yield
+            finally:
+                item.spans.extend(profile.spans)
+
+    def _read(self, item: _Item) -> Optional[GenerateResult]:
+        pending = self.generator.read(item.post, item.previous_digest)
+        if isinstance(pending, GenerateResult):
+            return pending
+        item.pending = pending
+        return None
+
+    def _draw(self, item: _Item) -> Optional[GenerateResult]:
+        assert item.pending is not None
+        item.im = self.generator.draw(item.pending)
+        return None
+
+    def _write(self, item: _Item) -> Optional[GenerateResult]:
+        assert item.pending is not None and item.im is not None
+        return self.generator.write(item.pending, item.im)
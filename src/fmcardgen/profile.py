@@ -0,0 +1,215 @@
+"""
+Per-stage timing of card generation, for `fmcardgen --profile`.
+
+Code that does something worth timing wraps it in `with stage("name"):`. That's
+(almost) free unless it's running inside `profiling()`, which records every
+stage -- along with the stages nested inside it -- as a `Span`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    ContextManager,
+    DefaultDict,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from .memory import MiB, current_rss
+
+if TYPE_CHECKING:
+    from rich.console import Console
+
+
+class Span(NamedTuple):
+    # the names of this stage and the ones it's nested inside, joined with "/",
+    # e.g. "draw/text field/wrap"
+    stage: str
+    # time.perf_counter() seconds
+    start: float
+    duration: float
+    # the process's resident memory at the end of the stage, in bytes
+    rss: Optional[int] = None
+
+
+class Profile(NamedTuple):
+    pid: int
+    thread: int
+    spans: List[Span]
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+        self._stack: List[str] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        self._stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            stage = "/".join(self._stack)
+            self.spans.append(Span(stage, start, duration, current_rss()))
+            self._stack.pop()
+
+
+_local = threading.local()
+_not_profiling = nullcontext()
+
+
+def stage(name: str) -> ContextManager[None]:
+    """
+    Time the code in this `with` block as the stage `name`, if profiling.
+    """
+    profiler: Optional[Profiler] = getattr(_local, "profiler", None)
+    if profiler is None:
+        return _not_profiling
+    return profiler.stage(name)
+
+
+@contextmanager
+def profiling() -> Iterator[Profile]:
+    """
+    Record stages in this thread, until the end of the `with` block, into the
+    Profile it returns.
+    """
+    previous = getattr(_local, "profiler", None)
+    profiler = _local.profiler = Profiler()
+    try:
+        yield Profile(os.getpid(), threading.get_ident(), profiler.spans)
+    finally:
+        _local.profiler = previous
+
+
+class ProfileReport:
+    """
+    Collects the profiles of every post in a run, and summarizes them.
+
+    Only what's asked for is kept, since a run can have any number of posts:
+    the peak memory after each stage always; every stage's timings, and each
+    post's total, if `timings` is set (for `print()`); and every profile, span
+    by span, if `trace` is set (for `write_chrome_trace()`).
+    """
+
+    def __init__(self, timings: bool = True, trace: bool = False) -> None:
+        self.timings = timings
+        self.trace = trace
+        self.stages: DefaultDict[str, List[float]] = defaultdict(list)
+        # the most memory a process had after each stage, in bytes
+        self.rss: Dict[str, int] = {}
+        self.posts: List[Tuple[float, Path]] = []
+        self.profiles: List[Tuple[Path, Profile]] = []
+
+    def add(self, post: Path, profile: Profile) -> None:
+        for span in profile.spans:
+            if span.rss is not None:
+                self.rss[span.stage] = max(span.rss, self.rss.get(span.stage, 0))
+        if self.timings:
+            for span in profile.spans:
+                self.stages[span.stage].append(span.duration)
+            total = sum(s.duration for s in profile.spans if "/" not in s.stage)
+            self.posts.append((total, post))
+        if self.trace:
+            self.profiles.append((post, profile))
+
+    def print(self, console: Optional[Console] = None, slowest: int = 10) -> None:
+        from rich.console import Console
+        from rich.table import Table
+
+        console = console or Console()
+
+        table = Table(title="Time (ms) and peak RSS (MiB) per stage")
+        table.add_column("stage", no_wrap=True)
+        for column in ["calls", "total", "mean", "p50", "p90", "p99", "max", "RSS"]:
+            table.add_column(column, justify="right", no_wrap=True)
+        for name in sorted(self.stages):
+            times = sorted(self.stages[name])
+            table.add_row(
+                _label(name),
+                str(len(times)),
+                _ms(sum(times)),
+                _ms(sum(times) / len(times)),
+                _ms(_percentile(times, 50)),
+                _ms(_percentile(times, 90)),
+                _ms(_percentile(times, 99)),
+                _ms(times[-1]),
+                _mib(self.rss.get(name)),
+            )
+        console.print(table)
+
+        table = Table(title=f"Slowest {slowest} posts (ms)")
+        table.add_column("post")
+        table.add_column("time", justify="right", no_wrap=True)
+        slowest_posts = sorted(self.posts, key=lambda p: p[0], reverse=True)
+        for total, post in slowest_posts[:slowest]:
+            table.add_row(str(post), _ms(total))
+        console.print(table)
+
+    def print_memory(self, console: Optional[Console] = None) -> None:
+        """
+        Print just the peak memory after each stage, for `--max-memory`.
+        """
+        from rich.console import Console
+        from rich.table import Table
+
+        console = console or Console()
+        table = Table(title="Peak RSS (MiB)")
+        table.add_column("stage", no_wrap=True)
+        table.add_column("RSS", justify="right", no_wrap=True)
+        for name in sorted(self.rss):
+            table.add_row(_label(name), _mib(self.rss[name]))
+        console.print(table)
+
+    def write_chrome_trace(self, path: Path) -> None:
+        """
+        Write the profiles in Chrome's trace event format, for chrome://tracing,
+        https://ui.perfetto.dev, speedscope, etc.
+        """
+        events = []
+        for post, profile in self.profiles:
+            for span in profile.spans:
+                event = {
+                    "name": span.stage.rsplit("/", 1)[-1],
+                    "cat": span.stage,
+                    "ph": "X",
+                    "ts": span.start * 1e6,
+                    "dur": span.duration * 1e6,
+                    "pid": profile.pid,
+                    "tid": profile.thread,
+                }
+                if "/" not in span.stage:
+                    event["args"] = {"post": str(post)}
+                events.append(event)
+        path.write_text(json.dumps({"traceEvents": events}))
+
+
+def _label(stage: str) -> str:
+    # the stage's own name, indented under the stages it's nested inside
+    return "  " * stage.count("/") + stage.rsplit("/", 1)[-1]
+
+
+def _percentile(sorted_times: List[float], percent: float) -> float:
+    return sorted_times[round(percent / 100 * (len(sorted_times) - 1))]
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}"
+
+
+def _mib(size: Optional[int]) -> str:
+    return "-" if size is None else f"{size / MiB:.0f}"
@@ -0,0 +1,70 @@
+"""
+The library API: render cards in-process, e.g. from a static site generator
+plugin, without going through files or the command line.
+
+    from fmcardgen import CardGenConfig, CardRenderer
+
+    renderer = CardRenderer(CardGenConfig.from_file(Path("fmcardgen.toml")))
+    for post in posts:
+        png = renderer.render_bytes(post.metadata)
+"""
+
+from pathlib import Path
+from typing import Any, Mapping, Optional, Union, get_args
+
+from PIL import Image
+
+from .config import CardGenConfig, ImageFormat
+from .draw import RenderPlan, load_template
+from .encode import Encoder
+
+
+class CardRenderer:
+    """
+    Renders cards from frontmatter with one config, which is compiled (see
+    `RenderPlan`) once, when the renderer is created: fonts are loaded, and the
+    template decoded, up front. Text measurements are cached as cards are drawn,
+    so the more cards a renderer draws, the quicker each one gets.
+
+    A renderer can be shared between threads, and each thread can render with
+    it at the same time: each card is drawn on its own copy of the template,
+    and everything that's shared is only read.
+
+    Like `RenderPlan`, a renderer doesn't track changes to the config it's
+    created from; create a new one instead.
+    """
+
+    def __init__(self, config: CardGenConfig) -> None:
+        self.config = config
+        self.plan = RenderPlan(config)
+        self.encoder = Encoder(config.encoding)
+        self.format: ImageFormat = config.encoding.format or "png"
+        load_template(self.plan.template)
+
+    def render(self, fm: Mapping[str, Any]) -> Image.Image:
+        """
+        Draw the card for a post's frontmatter.
+        """
+        return self.plan.draw(fm)
+
+    def render_bytes(
+        self, fm: Mapping[str, Any], format: Optional[ImageFormat] = None
+    ) -> bytes:
+        """
+        Draw the card for a post's frontmatter, and encode it with the config's
+        encoding settings, as `format` or else the config's format (or PNG).
+        """
+        fmt = format or self.format
+        if fmt not in get_args(ImageFormat):
+            raise ValueError(
+                f"unknown format {fmt!r}; must be one of: "
+                + ", ".join(get_args(ImageFormat))
+            )
+        return self.encoder.encode(self.render(fm), fmt)
+
+    def save(self, fm: Mapping[str, Any], dest: Union[str, Path]) -> None:
+        """
+        Draw the card for a post's frontmatter, and write it to `dest`, in the
+        format its extension calls for (unless the config sets a format).
+        """
+        self.encoder.save(self.render(fm), str(dest))
@@ -0,0 +1,219 @@
+"""
+`fmcardgen serve`: a local HTTP server that renders cards on demand.
+
+    GET /card?post=path/to/post.md
+
+renders the card for a post (relative to the server's root directory), and
+
+    POST /card
+
+renders the card for a JSON object of frontmatter given as the request body.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Mapping, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .config import CardGenConfig
+from .dependencies import Dependencies, config_files
+from .draw import clear_font_caches
+from .encode import CONTENT_TYPES
+from .frontmatter import read_frontmatter
+from .manifest import stamp
+from .renderer import CardRenderer
+
+
+class CardCache:
+    """
+    A bounded, thread-safe LRU cache of encoded cards, keyed by the digest of
+    their inputs.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._cards: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            card = self._cards.get(key)
+            if card is not None:
+                self._cards.move_to_end(key)
+            return card
+
+    def put(self, key: str, card: bytes) -> None:
+        with self._lock:
+            self._cards[key] = card
+            self._cards.move_to_end(key)
+            while len(self._cards) > self.size:
+                self._cards.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cards.clear()
+
+
+class CardServer(ThreadingHTTPServer):
+    """
+    Serves cards rendered with a single, warm, CardRenderer. At most
+    `max_concurrency` cards are rendered at once; requests that can't start
+    rendering within `queue_timeout` seconds get a 503.
+
+    The template and fonts are checked for changes on every request; when they
+    change, they're loaded again, and cards drawn with the old ones are
+    forgotten (and get new ETags).
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        config: CardGenConfig,
+        root: Path,
+        cache_size: int = 256,
+        max_concurrency: int = 4,
+        queue_timeout: float = 10.0,
+    ) -> None:
+        super().__init__(address, CardRequestHandler)
+        self.config = config
+        self.root = root.resolve()
+        self.renderer = CardRenderer(config)
+        self.dependencies = Dependencies.of_cards(config)
+        self.files = config_files(config)
+        self.file_stamps = [stamp(path) for path in self.files]
+        self.reload_lock = threading.Lock()
+        self.cache = CardCache(cache_size)
+        self.render_slots = threading.BoundedSemaphore(max_concurrency)
+        self.queue_timeout = queue_timeout
+
+    @property
+    def url(self) -> str:
+        host, port = self.socket.getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def card_key(self, fm: Mapping[str, Any]) -> str:
+        self.reload_if_changed()
+        return self.dependencies.digest(fm)
+
+    def reload_if_changed(self) -> None:
+        """
+        If the template or a font has changed since it was loaded, load it
+        again, and start over with new card keys and an empty cache.
+        """
+        with self.reload_lock:
+            stamps = [stamp(path) for path in self.files]
+            if stamps == self.file_stamps:
+                return
+            clear_font_caches()
+            try:
+                renderer = CardRenderer(self.config)
+                dependencies = Dependencies.of_cards(self.config)
+            except OSError:
+                # Probably saved half-way through; keep the old ones until it
+                # can be read
+                return
+            self.renderer = renderer
+            self.dependencies = dependencies
+            self.cache.clear()
+            self.file_stamps = stamps
+
+    def render(self, fm: Mapping[str, Any]) -> bytes:
+        return self.renderer.render_bytes(fm)
+
+
+class ServerBusy(Exception):
+    pass
+
+
+class CardRequestHandler(BaseHTTPRequestHandler):
+    server: CardServer
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path != "/card":
+            return self.send_error(HTTPStatus.NOT_FOUND)
+
+        post = parse_qs(url.query).get("post")
+        if not post:
+            return self.send_error(HTTPStatus.BAD_REQUEST, "missing ?post=")
+
+        path = (self.server.root / post[0]).resolve()
+        if self.server.root not in path.parents or not path.is_file():
+            return self.send_error(HTTPStatus.NOT_FOUND, f"no such post: {post[0]}")
+
+        try:
+            fm = read_frontmatter(path)
+        except Exception as e:
+            return self.send_unprocessable(f"can't read post: {post[0]}", e)
+        self.send_card(fm)
+
+    def do_POST(self) -> None:
+        if urlsplit(self.path).path != "/card":
+            return self.send_error(HTTPStatus.NOT_FOUND)
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            return self.send_error(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+        try:
+            fm = json.loads(self.rfile.read(length))
+        except ValueError as e:
+            return self.send_error(HTTPStatus.BAD_REQUEST, f"invalid JSON: {e}")
+        if not isinstance(fm, dict):
+            return self.send_error(HTTPStatus.BAD_REQUEST, "expected a JSON object")
+
+        self.send_card(fm)
+
+    def send_card(self, fm: Mapping[str, Any]) -> None:
+        key = self.server.card_key(fm)
+        etag = f'"{key}"'
+
+        if etag in self.headers.get("If-None-Match", ""):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        try:
+            card = self.get_card(key, fm)
+        except ServerBusy:
+            self.send_error(HTTPStatus.SERVICE_UNAVAILABLE, "too many cards rendering")
+            return
+        except Exception as e:
+            self.send_unprocessable("can't render card", e)
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", CONTENT_TYPES[self.server.renderer.format])
+        self.send_header("Content-Length", str(len(card)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(card)
+
+    def send_unprocessable(self, message: str, e: Exception) -> None:
+        # The reason phrase has to fit on one line, and error messages (from
+        # YAML, say) often don't, so the error goes in the body
+        self.send_error(
+            HTTPStatus.UNPROCESSABLE_ENTITY, message, f"{type(e).__name__}: {e}"
+        )
+
+    def get_card(self, key: str, fm: Mapping[str, Any]) -> bytes:
+        card = self.server.cache.get(key)
+        if card is None:
+            if not self.server.render_slots.acquire(timeout=self.server.queue_timeout):
+                raise ServerBusy()
+            try:
+                card = self.server.render(fm)
+            finally:
+                self.server.render_slots.release()
+            self.server.cache.put(key, card)
+        return card
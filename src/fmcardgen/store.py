@@ -0,0 +1,104 @@
+"""
+Reusing cards: when several posts would get identical cards -- translations that
+share a title, say -- only the first is drawn, and the rest are copies of it.
+"""
+
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+
+class CardStore:
+    """
+    Finished cards, by the digest of their inputs (see `Generator`).
+
+    Cards written by this process are remembered in memory. If `directory` is
+    given, cards are kept there too, so that other processes, and later runs,
+    can reuse them.
+
+    Cards are hard-linked into place where possible, copied where not.
+    """
+
+    def __init__(self, directory: Optional[Path] = None) -> None:
+        self.directory = directory
+        self._cards: Dict[str, str] = {}
+
+    def get(self, digest: str, dest: str) -> bool:
+        """
+        Put the card with this digest at `dest`, if there is one, and return
+        whether there was.
+        """
+        # The same inputs encoded as a different format make a different card
+        key = digest + _suffix(dest)
+        for source in self._sources(key):
+            if not os.path.isfile(source):
+                continue
+            if os.path.abspath(source) != os.path.abspath(dest):
+                try:
+                    link_or_copy(source, dest)
+                except OSError:
+                    continue
+            self._cards[key] = dest
+            return True
+        return False
+
+    def put(self, digest: str, dest: str) -> None:
+        """
+        Remember the card at `dest`, which has this digest.
+        """
+        key = digest + _suffix(dest)
+        self._cards[key] = dest
+        if self.directory is not None:
+            stored = self.directory / key
+            if not stored.exists():
+                self.directory.mkdir(parents=True, exist_ok=True)
+                link_or_copy(dest, str(stored))
+
+    def _sources(self, key: str) -> List[str]:
+        sources = []
+        if key in self._cards:
+            sources.append(self._cards[key])
+        if self.directory is not None:
+            sources.append(str(self.directory / key))
+        return sources
+
+
+def link_or_copy(source: str, dest: str) -> None:
+    """
+    Hard-link `source` to `dest`, or copy it if it can't be linked (e.g. it's on
+    a different filesystem).
+    """
+    with replacing(dest) as tmp:
+        try:
+            os.link(source, tmp)
+        except OSError:
+            shutil.copyfile(source, tmp)
+
+
+@contextmanager
+def replacing(dest: str) -> Iterator[str]:
+    """
+    Gives a temporary path to write `dest` to, which is moved into place at the
+    end of the `with` block (or removed, if there's an error).
+
+    Cards must always be replaced like this rather than overwritten in place:
+    overwriting a hard-linked card would change every card it's linked to.
+    """
+    # unique to this process and thread, and with the same extension as dest,
+    # so Pillow can still tell what format to write
+    root, ext = os.path.splitext(dest)
+    tmp = f"{root}.tmp-{os.getpid()}-{threading.get_ident()}{ext}"
+    try:
+        yield tmp
+        os.replace(tmp, dest)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _suffix(dest: str) -> str:
+    return os.path.splitext(dest)[1].lower()
@@ -0,0 +1,143 @@
+"""
+Find posts under a directory, for --recursive.
+"""
+
+import os
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+# Directories that never contain posts, but can contain an awful lot of files.
+DEFAULT_IGNORE = [".git/", ".hg/", ".svn/", "node_modules/", "__pycache__/"]
+
+
+class IgnoreRule(NamedTuple):
+    """
+    A single .gitignore-style pattern. `base` is the directory (relative to the
+    directory being walked, in posix form, "" for the top) that the rule came
+    from; rules only apply to paths underneath it.
+    """
+
+    base: str
+    pattern: str
+    negate: bool
+    dir_only: bool
+    anchored: bool
+
+    @classmethod
+    def parse(cls, line: str, base: str = "") -> "IgnoreRule":
+        negate = line.startswith("!")
+        pattern = line[1:] if negate else line
+        dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # Like git: a pattern with a slash anywhere but the end only matches
+        # relative to `base`, otherwise it can match a name at any depth.
+        anchored = "/" in pattern
+        return cls(base, pattern.lstrip("/"), negate, dir_only, anchored)
+
+    def matches(self, rel_path: str, name: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not rel_path.startswith(self.base + "/"):
+                return False
+            rel_path = rel_path[len(self.base) + 1 :]
+        if not self.anchored:
+            return fnmatchcase(name, self.pattern)
+        return _match_segments(rel_path.split("/"), self.pattern.split("/"))
+
+
+def _match_segments(path: Sequence[str], pattern: Sequence[str]) -> bool:
+    """
+    Match a path against a pattern one segment at a time, so that, as in
+    .gitignore, wildcards never match a "/", but a "**" segment matches any
+    number of directories: "**/x" matches "x" at any depth, "a/**/b" matches
+    "a/b" and "a/x/y/b", and "a/**" matches everything inside "a".
+    """
+    if not pattern:
+        return not path
+    if pattern[0] == "**":
+        if len(pattern) == 1:
+            return bool(path)
+        return any(_match_segments(path[i:], pattern[1:]) for i in range(len(path) + 1))
+    return (
+        bool(path)
+        and fnmatchcase(path[0], pattern[0])
+        and _match_segments(path[1:], pattern[1:])
+    )
+
+
+def parse_ignore_file(path: Path, base: str = "") -> List[IgnoreRule]:
+    rules = []
+    for line in path.read_text().splitlines():
+        line = line.rstrip()
+        if line and not line.startswith("#"):
+            rules.append(IgnoreRule.parse(line, base))
+    return rules
+
+
+def is_ignored(
+    rules: Sequence[IgnoreRule], rel_path: str, name: str, is_dir: bool
+) -> bool:
+    # As with .gitignore, the last matching rule wins
+    ignored = False
+    for rule in rules:
+        if rule.matches(rel_path, name, is_dir):
+            ignored = not rule.negate
+    return ignored
+
+
+def walk_posts(
+    root: Path,
+    ext: Iterable[str],
+    ignore: Iterable[str] = DEFAULT_IGNORE,
+    gitignore: bool = True,
+    walked: Optional[List[Path]] = None,
+) -> Iterator[Path]:
+    """
+    Yield every file under `root` with one of the given extensions, in sorted
+    order, in a single pass over the tree.
+
+    Files and directories matching `ignore` (.gitignore-style patterns) are
+    skipped -- ignored directories aren't descended into at all. If `gitignore`
+    is true, patterns in any .gitignore files found along the way are obeyed
+    too. Symlinked directories aren't followed.
+
+    Paths are yielded as they're found, so callers can start on the first posts
+    before the walk is finished. If `walked` is given, each directory is added
+    to it as it's scanned (e.g. to notice when one of them changes).
+    """
+    suffixes = tuple(f".{e}" for e in ext)
+    base_rules = [IgnoreRule.parse(pattern) for pattern in ignore]
+
+    # a stack of (directory, its path relative to root, rules that apply to it)
+    stack = [(str(root), "", base_rules)]
+    while stack:
+        dir_path, rel_dir, rules = stack.pop()
+
+        if gitignore and os.path.isfile(os.path.join(dir_path, ".gitignore")):
+            rules = rules + parse_ignore_file(
+                Path(dir_path, ".gitignore"), base=rel_dir
+            )
+
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        if walked is not None:
+            walked.append(Path(dir_path))
+
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if is_ignored(rules, rel_path, entry.name, is_dir):
+                continue
+            if is_dir:
+                subdirs.append((entry.path, rel_path, rules))
+            elif entry.name.endswith(suffixes) and entry.is_file():
+                yield Path(entry.path)
+
+        # reversed, so the stack pops them in order
+        stack.extend(reversed(subdirs))
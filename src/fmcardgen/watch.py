@@ -0,0 +1,152 @@
+"""
+`fmcardgen watch`: keep cards up to date as posts change.
+"""
+
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .config import DEFAULT_FONT, CardGenConfig
+from .draw import clear_font_caches
+from .generate import GenerateResult, Generator, find_posts
+from .walk import DEFAULT_IGNORE
+
+Mtimes = Dict[Path, Optional[int]]
+
+# How often to walk every directory again regardless, in seconds. Adding or
+# removing a post changes its directory's mtime, which is checked every poll,
+# but an edit to a .gitignore doesn't, and a change that lands in the same
+# timestamp tick as the walk before it can't be told apart.
+REWALK_INTERVAL = 5.0
+
+
+class Watcher:
+    """
+    Polls posts, the config file, the template, and fonts for changes.
+
+    Each poll only stats the posts that were found last time, and the
+    directories they were found in; the directories are only walked again
+    when one of them changes (i.e. a post might have been added or removed),
+    or every `REWALK_INTERVAL` seconds.
+
+    When a post changes, only its card is re-rendered. When the config, template,
+    or a font changes, the config is reloaded and every card is re-rendered.
+    Otherwise, the config, compiled render plan, fonts and template all stay
+    loaded between changes, so re-rendering a card is quick.
+
+    Cards aren't generated for posts that already exist when the watcher
+    starts; run `fmcardgen` for that.
+    """
+
+    def __init__(
+        self,
+        posts: List[Path],
+        config_path: Optional[Path] = None,
+        output: Optional[str] = None,
+        ext: Iterable[str] = ("md",),
+        ignore: Iterable[str] = DEFAULT_IGNORE,
+        gitignore: bool = True,
+    ) -> None:
+        self.posts = posts
+        self.config_path = config_path
+        self.output = output
+        self.ext = list(ext)
+        self.ignore = list(ignore)
+        self.gitignore = gitignore
+
+        self.generator = self._load()
+        self.resource_mtimes = _mtimes(self._resources())
+        self.dir_mtimes: Mtimes = {}
+        self.walked_at = 0.0
+        self.post_mtimes = _mtimes(self._walk())
+
+    def _load(self) -> Generator:
+        if self.config_path:
+            config = CardGenConfig.from_file(self.config_path)
+        else:
+            config = CardGenConfig()
+        output = str(config.output if self.output is None else self.output)
+        return Generator(config, output)
+
+    def _resources(self) -> List[Path]:
+        """
+        Files that, when they change, affect every card
+        """
+        config = self.generator.config
+        paths = [Path(config.template)]
+        paths.extend(Path(f.path) for f in config.fonts)
+        paths.extend(
+            Path(str(f.font)) for f in config.text_fields if f.font != DEFAULT_FONT
+        )
+        if self.config_path:
+            paths.append(self.config_path)
+        return paths
+
+    def _walk(self) -> List[Path]:
+        walked: List[Path] = []
+        posts = list(
+            find_posts(self.posts, self.ext, self.ignore, self.gitignore, walked)
+        )
+        self.dir_mtimes = _mtimes(walked)
+        self.walked_at = time.monotonic()
+        return posts
+
+    def _posts(self) -> Iterable[Path]:
+        if (
+            _mtimes(self.dir_mtimes) != self.dir_mtimes
+            or time.monotonic() - self.walked_at >= REWALK_INTERVAL
+        ):
+            return self._walk()
+        return self.post_mtimes
+
+    def poll(self) -> List[GenerateResult]:
+        """
+        Check for changes once, and re-render any cards that need it.
+        """
+        resource_mtimes = _mtimes(self._resources())
+        post_mtimes = _mtimes(self._posts())
+
+        if resource_mtimes != self.resource_mtimes:
+            self.resource_mtimes = resource_mtimes
+            try:
+                self.generator = self._load()
+            except (OSError, ValueError) as e:
+                # Probably saved half-way through an edit; keep going with the
+                # old config until it's fixed.
+                path = self.config_path or Path(self.generator.config.template)
+                return [GenerateResult(path, error=f"{type(e).__name__}: {e}")]
+            clear_font_caches()
+            # the new config might use different files
+            self.resource_mtimes = _mtimes(self._resources())
+            changed = [p for p, mtime in post_mtimes.items() if mtime is not None]
+        else:
+            changed = [
+                p
+                for p, mtime in post_mtimes.items()
+                if mtime is not None and self.post_mtimes.get(p) != mtime
+            ]
+
+        self.post_mtimes = post_mtimes
+        return [self.generator(post) for post in changed]
+
+    def run(
+        self, report: Callable[[GenerateResult], None], interval: float = 0.05
+    ) -> None:
+        """
+        Poll forever (until interrupted), reporting each result.
+        """
+        while True:
+            for result in self.poll():
+                report(result)
+            time.sleep(interval)
+
+
+def _mtimes(paths: Iterable[Path]) -> Mtimes:
+    mtimes: Mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
@@ -1,9 +1,21 @@
-from pathlib import Path
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path, PosixPath
+from typing import List, Optional
 
 import pytest
+from PIL import Image
 from typer.testing import CliRunner
 
+import fmcardgen.cli as cli_module
 from fmcardgen.cli import cli
+from fmcardgen.config import CardGenConfig
+from fmcardgen.generate import GenerateResult, Generator
+from fmcardgen.manifest import Manifest
 
 
 @pytest.fixture(autouse=True)
@@ -34,6 +46,31 @@ def test_cli(tmp_path: Path, input: str, output: str):
     assert (tmp_path / output).is_file()
 
 
+@pytest.mark.parametrize(
+    "posts, processes",
+    [(["example.md"], 1), (["example.md", "example-bundle/index.md"], 2)],
+)
+def test_cli_single_post_renders_in_process(
+    tmp_path: Path, monkeypatch, posts: List[str], processes: int
+):
+    used: List[int] = []
+    run = cli_module._run
+
+    def record_processes(jobs, generator, processes, threads=None):
+        used.append(processes)
+        return run(jobs, generator, processes, threads)
+
+    monkeypatch.setattr(cli_module, "_run", record_processes)
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+    result = CliRunner().invoke(
+        cli,
+        ["--config", "config.yml", "--output", str(tmp_path / "{file_stem}.png")]
+        + posts,
+    )
+    assert result.exit_code == 0
+    assert used == [processes]
+
+
 def test_cli_directory_recursive(tmp_path: Path):
     runner = CliRunner()
     output = tmp_path / "{file_stem}.png"
@@ -59,3 +96,355 @@ def test_cli_directory_requires_recursive(tmp_path: Path):
     result = runner.invoke(cli, ["."])
     assert result.exit_code == 1
     assert "must pass --recursive to walk directories\n" == result.output
+
+
+@pytest.mark.parametrize(
+    "workers",
+    [
+        ["--jobs", "1"],
+        ["--jobs", "2"],
+        ["--threads", "1"],
+        ["--threads", "2"],
+        ["--pipeline"],
+        ["--pipeline", "--readers", "2", "--writers", "3", "--queue-size", "1"],
+    ],
+)
+def test_cli_jobs(tmp_path: Path, workers: List[str]):
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "--config",
+            "config.yml",
+            "--output",
+            str(tmp_path / "{file_stem}.png"),
+            *workers,
+            "example.md",
+            "example-bundle/index.md",
+        ],
+    )
+    assert result.exit_code == 0
+    assert (tmp_path / "example.png").is_file()
+    assert (tmp_path / "example-bundle.png").is_file()
+
+    # results are reported in the order posts were given
+    assert result.output.index("example.md ->") < result.output.index(
+        "example-bundle/index.md ->"
+    )
+
+
+@pytest.mark.parametrize(
+    "workers", [["--jobs", "2", "--threads", "2"], ["--threads", "2", "--pipeline"]]
+)
+def test_cli_one_way_of_running(workers: List[str]):
+    result = CliRunner().invoke(cli, [*workers, "example.md"])
+    assert result.exit_code == 1
+    assert "pass only one of --jobs, --threads, or --pipeline" in result.output
+
+
+def test_cli_failure_doesnt_stop_run(tmp_path: Path):
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "--config",
+            "config.yml",
+            # example-bundle doesn't have a slug, so formatting this fails
+            "--output",
+            str(tmp_path / "{slug}.png"),
+            "--jobs",
+            "1",
+            "example-bundle/index.md",
+            "example.md",
+        ],
+    )
+    assert result.exit_code == 1
+    assert "KeyError: 'slug'" in result.output
+    assert not list(tmp_path.iterdir())
+
+
+def test_generate_in_worker(tmp_path: Path):
+    generator = Generator(CardGenConfig(), str(tmp_path / "{file_stem}.png"))
+    cli_module._init_worker(generator)
+    result = cli_module._generate_in_worker(Path("example.md"), None)
+    assert result.error is None
+    assert result.dest == str(tmp_path / "example.png")
+
+
+def test_imap_keeps_order_with_small_window():
+    def slow_then_fast(p: Path) -> GenerateResult:
+        time.sleep(0.05 if p.name == "a" else 0)
+        return GenerateResult(p)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = cli_module._imap(
+            executor, slow_then_fast, [(Path(p),) for p in "abc"], window=2
+        )
+        assert [r.post.name for r in results] == ["a", "b", "c"]
+
+
+class CrashesWorker(PosixPath):
+    """
+    A post that kills the worker process it's sent to, the way the kernel's
+    OOM killer would: the worker exits as it unpickles it.
+    """
+
+    def __reduce__(self):
+        return os._exit, (1,)
+
+
+def test_cli_survives_a_crashed_worker(tmp_path: Path, monkeypatch):
+    names = ["a", "b", "crash", "c", "d", "e"]
+    posts = [tmp_path / f"{name}.md" for name in names]
+    for post in posts:
+        post.write_text(f"---\ntitle: {post.stem}\n---\n")
+    posts[2] = CrashesWorker(posts[2])
+    monkeypatch.setattr("fmcardgen.generate.find_posts", lambda *args: iter(posts))
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "--config",
+            "config.yml",
+            "--output",
+            str(tmp_path / "{file_stem}.png"),
+            "--manifest",
+            str(tmp_path / "manifest.json"),
+            "--jobs",
+            "2",
+            *map(str, posts),
+        ],
+    )
+    assert result.exit_code == 1
+    assert "crash.md: BrokenProcessPool" in result.output
+    cards = [name for name in names if (tmp_path / f"{name}.png").is_file()]
+    assert cards == ["a", "b", "c", "d", "e"]
+    manifest = Manifest.load(tmp_path / "manifest.json")
+    assert sorted(Path(post).stem for post in manifest.entries) == cards
+
+
+def test_run_in_processes_only_retries_unfinished_posts(monkeypatch):
+    def fail_on_crash(post: Path, previous_digest: Optional[str]) -> GenerateResult:
+        if post.name == "crash":
+            raise BrokenProcessPool
+        return GenerateResult(post)
+
+    # Threads stand in for processes, so that which posts fail is predictable
+    monkeypatch.setattr(cli_module, "_generate_in_worker", fail_on_crash)
+    monkeypatch.setattr(
+        cli_module, "_process_pool", lambda generator, n: ThreadPoolExecutor(n)
+    )
+    jobs = [(Path(name), None) for name in ["a", "crash", "b", "c"]]
+    generator = Generator(CardGenConfig(), "{file_stem}.png")
+    results = list(cli_module._run_in_processes(jobs, generator, 2))
+    assert [r.post.name for r in results] == ["a", "crash", "b", "c"]
+    assert [r.error is not None for r in results] == [False, True, False, False]
+
+
+def test_run_in_processes_pool_breaks_between_submits(monkeypatch):
+    broke = []
+
+    class BreaksOnce(ThreadPoolExecutor):
+        # As if a worker died after "a" was submitted, and before "b" was
+        def submit(self, fn, /, *args, **kwargs):
+            if args[0].name == "b" and not broke:
+                broke.append(args[0])
+                raise BrokenProcessPool
+            return super().submit(fn, *args, **kwargs)
+
+    monkeypatch.setattr(
+        cli_module, "_generate_in_worker", lambda post, digest: GenerateResult(post)
+    )
+    monkeypatch.setattr(cli_module, "_process_pool", lambda generator, n: BreaksOnce(n))
+    jobs = [(Path(name), None) for name in "abcd"]
+    generator = Generator(CardGenConfig(), "{file_stem}.png")
+    results = list(cli_module._run_in_processes(jobs, generator, 2))
+    assert [r.post.name for r in results] == ["a", "b", "c", "d"]
+    assert all(r.error is None for r in results)
+    assert broke == [Path("b")]
+
+
+def test_cli_manifest(tmp_path: Path):
+    post = tmp_path / "post.md"
+    post.write_text("---\ntitle: Hello\n---\n\nbody")
+    args = [
+        "--config",
+        "config.yml",
+        "--output",
+        str(tmp_path / "{file_stem}.png"),
+        "--manifest",
+        str(tmp_path / "manifest.json"),
+        "--jobs",
+        "1",
+        str(post),
+    ]
+    runner = CliRunner()
+
+    result = runner.invoke(cli, args)
+    assert result.exit_code == 0
+    assert "post.png" in result.output
+    card_mtime = (tmp_path / "post.png").stat().st_mtime_ns
+
+    # nothing changed: skipped without being read
+    result = runner.invoke(cli, args)
+    assert result.exit_code == 0
+    assert result.output == "1 cards already up to date\n"
+
+    # the body changed, but not anything the card uses: skipped after reading
+    post.write_text("---\ntitle: Hello\n---\n\na longer body")
+    result = runner.invoke(cli, args)
+    assert result.output == "1 cards already up to date\n"
+    assert (tmp_path / "post.png").stat().st_mtime_ns == card_mtime
+
+    # the title changed: re-rendered
+    post.write_text("---\ntitle: Goodbye\n---\n\na longer body")
+    result = runner.invoke(cli, args)
+    assert "post.png" in result.output
+
+    # the card was replaced by something else: re-rendered
+    (tmp_path / "post.png").write_bytes(b"not a card")
+    result = runner.invoke(cli, args)
+    assert "post.png" in result.output
+    assert Image.open(tmp_path / "post.png").size == (1200, 628)
+
+    # errors remove the post from the manifest
+    post.write_text("no frontmatter")
+    result = runner.invoke(cli, args)
+    assert result.exit_code == 1
+    assert str(post) not in (tmp_path / "manifest.json").read_text()
+
+
+def test_cli_directory_recursive_ignore(tmp_path: Path):
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "--config",
+            "config.yml",
+            "--output",
+            str(tmp_path / "{file_stem}.png"),
+            "--recursive",
+            ".",
+            "--ext",
+            "md",
+            "--ignore",
+            "example-bundle/",
+        ],
+    )
+    assert result.exit_code == 0
+    assert (tmp_path / "example.png").is_file()
+    assert not (tmp_path / "example-bundle.png").exists()
+
+
+def test_cli_encoding_options(tmp_path: Path):
+    result = CliRunner().invoke(
+        cli,
+        [
+            "--config",
+            "config.yml",
+            "--output",
+            str(tmp_path / "{file_stem}.png"),
+            "--format",
+            "webp",
+            "--preset",
+            "small",
+            "--quality",
+            "60",
+            "--compress-level",
+            "9",
+            "example.md",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    # --format wins over the extension
+    assert Image.open(tmp_path / "example.png").format == "WEBP"
+
+
+def test_cli_palette(tmp_path: Path):
+    result = CliRunner().invoke(
+        cli,
+        [
+            "--config",
+            "config.yml",
+            "--output",
+            str(tmp_path / "{file_stem}.png"),
+            "--palette",
+            "--max-colors",
+            "128",
+            "example.md",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    card = Image.open(tmp_path / "example.png")
+    assert card.mode == "P"
+    assert card.getcolors(128) is not None
+
+
+def test_cli_encoding_options_checked(tmp_path: Path):
+    result = CliRunner().invoke(
+        cli, ["--config", "config.yml", "--format", "bmp", "example.md"]
+    )
+    assert result.exit_code == 2
+    assert "must be one of: png, webp, jpeg, avif" in result.output
+
+
+def test_cli_config_cache(tmp_path: Path):
+    args = ["--config", "config.yml", "--output", str(tmp_path / "{file_stem}.png")]
+    env = {"FMCARDGEN_CONFIG_CACHE": str(tmp_path / "cache")}
+    for _ in range(2):
+        result = CliRunner().invoke(cli, [*args, "example.md"], env=env)
+        assert result.exit_code == 0, result.output
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+    assert (tmp_path / "example.png").is_file()
+
+
+def test_main_is_render():
+    assert cli_module.main is cli_module.render
+
+
+def test_cli_imports_are_lazy():
+    # Heavy dependencies are only imported by the commands that need them, so
+    # that starting up (and --help) is quick
+    heavy = ["PIL", "pydantic", "dateutil", "rich", "yaml", "toml", "frontmatter"]
+    code = (
+        f"import sys, fmcardgen.cli; print([m for m in {heavy!r} if m in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
+
+
+@pytest.mark.parametrize(
+    "workers, fits",
+    [
+        (["--jobs", "2"], "1 process,"),
+        (["--threads", "2"], "2 threads"),
+        (["--pipeline", "--queue-size", "8"], "1 renderers, 2 writers, queues of 5"),
+    ],
+)
+def test_cli_max_memory(tmp_path: Path, workers: List[str], fits: str):
+    result = CliRunner().invoke(
+        cli,
+        [
+            "--config",
+            "config.yml",
+            "--output",
+            str(tmp_path / "{file_stem}.png"),
+            "--max-memory",
+            "140M",
+            *workers,
+            "example.md",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert f"rendering with {fits}" in result.output
+    assert "Peak RSS" in result.output
+    assert (tmp_path / "example.png").is_file()
+
+
+@pytest.mark.parametrize("size", ["lots", "10M"])
+def test_cli_max_memory_invalid(size: str):
+    result = CliRunner().invoke(cli, ["--max-memory", size, "example.md"])
+    assert result.exit_code == 2
+    assert "--max-memory" in result.output
@@ -1,6 +1,9 @@
+import shutil
 from pathlib import Path
+from typing import Any, List
 
 import pytest
+from PIL import ImageFont
 from pydantic import ValidationError
 
 from fmcardgen import config
@@ -130,3 +133,112 @@ def test_parser_multiple_sources():
         source=["x", "y"], parse={"x": "datetime"}, format="{x}", x=0, y=0
     )
     # test for can't have multiple parsers with multi=true
+
+
+@pytest.mark.parametrize(
+    "name, text",
+    [
+        ("config.toml", "output = 'x.png'"),
+        ("config.yml", "output: x.png"),
+        ("config.yaml", "output: x.png"),
+        ("config.json", '{"output": "x.png"}'),
+        ("config.conf", '{"output": "x.png"}'),
+        ("config.conf", "output = 'x.png'"),
+    ],
+)
+def test_config_format_detection(tmp_path: Path, name: str, text: str):
+    (tmp_path / name).write_text(text)
+    assert config.CardGenConfig.from_file(tmp_path / name).output == "x.png"
+
+
+@pytest.mark.parametrize("name", ["config.toml", "config.yml", "config.json"])
+def test_config_parse_errors(tmp_path: Path, name: str):
+    (tmp_path / name).write_text("output: [")
+    with pytest.raises(ValueError, match=f"Couldn't load config file .*{name}"):
+        config.CardGenConfig.from_file(tmp_path / name)
+
+
+def test_font_validator_reads_only_the_signature(monkeypatch):
+    opened = []
+    monkeypatch.setattr(ImageFont, "truetype", opened.append)
+    config.FontConfig(path="RobotoCondensed/RobotoCondensed-Bold.ttf", name=None)
+    assert not opened
+
+
+def test_font_validator_opens_other_files(tmp_path: Path):
+    # not a font signature FreeType is checked for, but still a font
+    font = tmp_path / "font.ttf"
+    data = Path("RobotoCondensed/RobotoCondensed-Bold.ttf").read_bytes()
+    font.write_bytes(data)
+    opened = []
+
+    def truetype(path, size):
+        opened.append(path)
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(config, "FONT_SIGNATURES", set())
+        mp.setattr(ImageFont, "truetype", truetype)
+        config.FontConfig(path=font, name=None)
+    assert opened == [str(font)]
+
+
+def test_config_cache(tmp_path: Path, monkeypatch):
+    cache = tmp_path / "cache"
+    first = config.CardGenConfig.from_file(Path("config.yml"), cache)
+    assert [p.suffix for p in cache.iterdir()] == [".json"]
+
+    parsed: List[Any] = []
+    with monkeypatch.context() as mp:
+        mp.setattr(config, "_parse_config", lambda *args: parsed.append(args))
+        cached = config.CardGenConfig.from_file(Path("config.yml"), cache)
+    assert cached == first
+    assert not parsed
+
+    # a different file gets its own entry
+    config.CardGenConfig.from_file(Path("config.toml"), cache)
+    assert len(list(cache.iterdir())) == 2
+
+
+def test_config_cache_shared_between_directories(tmp_path: Path, monkeypatch):
+    cache = tmp_path / "cache"
+    config.CardGenConfig.from_file(Path("config.yml"), cache)
+    shutil.copytree(Path.cwd(), tmp_path / "copy")
+    monkeypatch.chdir(tmp_path / "copy")
+    config.CardGenConfig.from_file(Path("config.yml"), cache)
+    assert len(list(cache.iterdir())) == 1
+
+
+def test_config_cache_skips_what_json_cant_hold(tmp_path: Path):
+    path = tmp_path / "config.yml"
+    # bytes, which validate as a str, but which JSON has no way to store
+    path.write_text("output: !!binary Y2FyZC5wbmc=\n")
+    cache = tmp_path / "cache"
+    assert config.CardGenConfig.from_file(path, cache).output == "card.png"
+    assert not cache.exists()
+
+
+def test_config_cache_unwritable(tmp_path: Path):
+    (tmp_path / "somefile").write_text("")
+    cache = tmp_path / "somefile" / "cache"
+    assert config.CardGenConfig.from_file(Path("config.yml"), cache)
+
+
+@pytest.mark.parametrize("damage", ["corrupt", "invalid", "missing font"])
+def test_config_cache_revalidates(tmp_path: Path, monkeypatch, damage: str):
+    site = tmp_path / "site"
+    shutil.copytree(Path.cwd(), site)
+    monkeypatch.chdir(site)
+    cache = tmp_path / "cache"
+    first = config.CardGenConfig.from_file(Path("config.yml"), cache)
+    (cached,) = cache.iterdir()
+
+    if damage == "corrupt":
+        cached.write_bytes(b"\x80\x04not json")
+        assert config.CardGenConfig.from_file(Path("config.yml"), cache) == first
+    elif damage == "invalid":
+        cached.write_text('{"template": "nowhere.png"}')
+        assert config.CardGenConfig.from_file(Path("config.yml"), cache) == first
+    else:
+        (site / "RobotoCondensed" / "RobotoCondensed-Light.ttf").unlink()
+        with pytest.raises(ValidationError, match="does not point to a file"):
+            config.CardGenConfig.from_file(Path("config.yml"), cache)
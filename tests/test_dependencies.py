@@ -0,0 +1,129 @@
+import datetime
+import shutil
+from pathlib import Path
+
+import pytest
+
+from fmcardgen.config import CardGenConfig
+from fmcardgen.dependencies import (
+    Dependencies,
+    card_keys,
+    config_digest,
+    output_keys,
+    placeholder_keys,
+    used_keys,
+)
+
+
+@pytest.fixture(autouse=True)
+def set_working_directory(monkeypatch):
+    monkeypatch.chdir(Path(__file__).parent)
+
+
+def config(*fields: dict) -> CardGenConfig:
+    return CardGenConfig.model_validate(
+        {"fields": [dict(field, x=0, y=0) for field in fields]}
+    )
+
+
+@pytest.mark.parametrize(
+    "pattern, keys",
+    [
+        ("plain", set()),
+        ("{title}", {"title"}),
+        ("{date.year}-{tags[0]}", {"date", "tags"}),
+        ("{} {0} {title!r}", {"title"}),
+        ("{title:{width}}", {"title", "width"}),
+    ],
+)
+def test_placeholder_keys(pattern: str, keys: set):
+    assert placeholder_keys(pattern) == keys
+
+
+def test_card_keys():
+    cnf = config(
+        {"source": "title"},
+        {"source": ["author", "date"], "format": "{author} on {date:%Y}"},
+        {"source": "tags", "multi": True, "format": "#{}"},
+    )
+    assert card_keys(cnf) == {"title", "author", "date", "tags"}
+
+
+def test_format_keys_count_even_if_not_sources():
+    cnf = config({"source": "title", "format": "{title} by {author}"})
+    assert card_keys(cnf) == {"title", "author"}
+
+
+def test_output_keys():
+    assert output_keys("{slug}/{date.year}-{file_stem}-{file_name}.png") == {
+        "slug",
+        "date",
+    }
+
+
+def test_used_keys():
+    cnf = config(
+        {"source": "title"},
+        {"source": ["author", "date"], "format": "{author}"},
+    )
+    keys = used_keys(cnf, "{slug}/{date.year}-{tags[0]}-{file_stem}.png")
+    assert keys == {"title", "author", "date", "slug", "tags"}
+
+
+def test_config_digest(tmp_path: Path):
+    shutil.copy("template.png", tmp_path / "template.png")
+    cnf = CardGenConfig.from_file(Path("config.toml"))
+    cnf.template = tmp_path / "template.png"
+    digest = config_digest(cnf, "{slug}.png")
+    assert digest == config_digest(cnf, "{slug}.png")
+    assert digest != config_digest(cnf, "{title}.png")
+
+    # the output pattern that's used counts, not the one in the config
+    cnf.output = "somewhere-else.png"
+    assert digest == config_digest(cnf, "{slug}.png")
+
+    with open(tmp_path / "template.png", "ab") as f:
+        f.write(b"changed")
+    assert digest != config_digest(cnf, "{slug}.png")
+
+
+def test_project():
+    deps = Dependencies("abc", ["title", "tags"])
+    fm = {"title": "x", "body": "y", "draft": True}
+    assert deps.project(fm) == {"title": "x"}
+
+
+def test_digest():
+    deps = Dependencies("abc", ["title"])
+    digest = deps.digest({"title": "x", "body": "y"})
+    assert digest == deps.digest({"title": "x", "body": "z"})
+    assert digest == deps.digest({"body": "y", "title": "x", "unused": 1})
+    assert digest != deps.digest({"title": "z", "body": "y"})
+    assert digest != Dependencies("def", ["title"]).digest({"title": "x"})
+
+
+def test_digest_is_canonical():
+    deps = Dependencies("abc", ["title", "meta"])
+    a = {"title": "x", "meta": {"a": 1, "b": 2}}
+    b = {"meta": {"b": 2, "a": 1}, "title": "x"}
+    assert deps.digest(a) == deps.digest(b)
+    assert Dependencies("abc", ["meta", "title"]).digest(a) == deps.digest(a)
+
+
+def test_digest_missing_isnt_null():
+    deps = Dependencies("abc", ["title"])
+    assert deps.digest({}) != deps.digest({"title": None})
+
+
+def test_digest_dates():
+    deps = Dependencies("abc", ["date"])
+    assert deps.digest({"date": datetime.date(2021, 1, 1)}) == deps.digest(
+        {"date": "2021-01-01"}
+    )
+
+
+def test_of_cards():
+    cnf = CardGenConfig.from_file(Path("config.yml"))
+    deps = Dependencies.of_cards(cnf)
+    assert deps.keys == tuple(sorted(card_keys(cnf)))
+    assert deps.config_digest == config_digest(cnf, "")
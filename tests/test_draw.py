@@ -1,15 +1,16 @@
 import datetime
+import os
 import secrets
 from pathlib import Path
 from typing import Optional
 
-import dateutil.parser
 import pytest
-from PIL import Image, ImageChops, ImageFont, ImageStat
+from PIL import Image, ImageChops, ImageDraw, ImageFont, ImageStat
 from pydantic_extra_types.color import Color
 
 import fmcardgen.draw
 from fmcardgen.config import DEFAULT_FONT, CardGenConfig, TextFieldConfig
+from fmcardgen.frontmatter import parse_datetime
 
 CONFIG = {
     "template": "template.png",
@@ -239,7 +240,7 @@ def test_draw_get_parsers():
         }
     )
     parsers = fmcardgen.draw._get_parsers(field)
-    assert parsers == {"date1": dateutil.parser.parse, "date2": dateutil.parser.parse}
+    assert parsers == {"date1": parse_datetime, "date2": parse_datetime}
 
 
 def assert_images_equal(
@@ -292,3 +293,156 @@ def test_assert_images_equal(tmp_path: Path):
         Image.open("test_draw_wrapped.png"),
         save_location=tmp_path,
     )
+
+
+def test_load_template_decodes_once(monkeypatch, tmp_path: Path):
+    template = tmp_path / "template.png"
+    Image.new("RGBA", (10, 10), (255, 0, 0, 255)).save(template)
+
+    opened = []
+    real_open = Image.open
+
+    def counting_open(*args, **kwargs):
+        opened.append(args[0])
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr(Image, "open", counting_open)
+
+    first = fmcardgen.draw.load_template(template)
+    first.putpixel((0, 0), (0, 0, 0, 0))
+    second = fmcardgen.draw.load_template(template)
+    assert len(opened) == 1
+    # each caller gets its own copy
+    assert second.getpixel((0, 0)) == (255, 0, 0, 255)
+
+    # changing the file invalidates the cache
+    Image.new("RGBA", (10, 10), (0, 255, 0, 255)).save(template)
+    st = template.stat()
+    os.utime(template, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert fmcardgen.draw.load_template(template).getpixel((0, 0)) == (0, 255, 0, 255)
+    assert len(opened) == 2
+
+
+def test_load_template_converts_mode(tmp_path: Path):
+    template = tmp_path / "template.png"
+    Image.new("P", (10, 10)).save(template)
+    assert fmcardgen.draw.load_template(template).mode == "RGBA"
+
+
+def test_load_font_cached():
+    fmcardgen.draw._load_font.cache_clear()
+    font = fmcardgen.draw.load_font("RobotoCondensed/RobotoCondensed-Bold.ttf", 40)
+    assert font is fmcardgen.draw.load_font(
+        "RobotoCondensed/RobotoCondensed-Bold.ttf", 40.0
+    )
+    assert font is not fmcardgen.draw.load_font(
+        "RobotoCondensed/RobotoCondensed-Bold.ttf", 41
+    )
+    info = fmcardgen.draw.font_cache_info()
+    assert (info.hits, info.misses) == (1, 2)
+
+
+@pytest.mark.parametrize(
+    "bbox",
+    [
+        (10, 10, 30, 20),
+        (10.4, 9.5, 30.5, 20.6),
+        (-15.2, -3, 12.7, 8.5),
+        (50, 30, 80.3, 45),
+        # entirely off the image
+        (70, 10, 90, 20),
+        (-40, -30, -20, -10),
+    ],
+)
+def test_draw_rect_matches_full_overlay(bbox):
+    padding = fmcardgen.config.PaddingConfig(horizontal=3, top=1, bottom=2)
+    color = Color("#ff000066")
+    base = Image.new("RGBA", (60, 40), (10, 200, 30, 255))
+
+    # the straightforward version: a full-size overlay, composited over all of
+    # the image
+    x0, y0, x1, y1 = bbox
+    overlay = Image.new("RGBA", base.size, (0, 0, 0, 0))
+    ImageDraw.Draw(overlay).rectangle(
+        (x0 - 3, y0 - 1, x1 + 3, y1 + 2), fill=fmcardgen.draw.to_pil_color(color)
+    )
+    expected = base.copy()
+    expected.alpha_composite(overlay)
+
+    actual = base.copy()
+    fmcardgen.draw._draw_rect(actual, bbox, padding, color)
+    assert actual.tobytes() == expected.tobytes()
+
+
+def test_draw_batch_compositing():
+    config = CardGenConfig.model_validate(
+        {
+            "template": "template.png",
+            "fields": [
+                *TAG_CONFIG["fields"],
+                {
+                    "source": "title",
+                    "x": 120,
+                    "y": 300,
+                    "font": "RobotoCondensed/RobotoCondensed-Bold.ttf",
+                    "font_size": 60,
+                    "bg": "#00ff0066",
+                    "padding": 10,
+                },
+            ],
+        }
+    )
+    fm = {"title": "Hello World", "tags": ["one", "two", "three", "four"]}
+    expected = fmcardgen.draw.draw(fm, config)
+
+    config.batch_compositing = True
+    actual = fmcardgen.draw.draw(fm, config)
+    assert actual.tobytes() == expected.tobytes()
+
+
+def test_draw_fields_on_image(config: CardGenConfig):
+    """
+    draw_text_field and draw_tag_field can be given an image directly, rather
+    than a Painter
+    """
+    im = fmcardgen.draw.load_template("template.png")
+    fmcardgen.draw.draw_text_field(im, "Hello World", config.text_fields[0])
+    assert_images_equal(im, Image.open("test_draw_expected.png"))
+
+    im = fmcardgen.draw.load_template("template.png")
+    tag_config = CardGenConfig.model_validate(TAG_CONFIG)
+    fmcardgen.draw.draw_tag_field(
+        im, ["one", "two", "three", "four"], tag_config.text_fields[0]
+    )
+    assert_images_equal(im, Image.open("test_draw_tags_expected.png"))
+
+
+def test_composite_rects_nothing_to_draw():
+    im = Image.new("RGBA", (10, 10))
+    fmcardgen.draw._composite_rects(im, [])
+    assert im.getbbox() is None
+
+
+def test_wrap_font_text_caches_widths():
+    font = fmcardgen.draw.load_font("RobotoCondensed/RobotoCondensed-Bold.ttf", 40)
+    fmcardgen.draw._chunk_width.cache_clear()
+    first = fmcardgen.draw.wrap_font_text(font, "the cat and the hat", 100)
+    misses = fmcardgen.draw._chunk_width.cache_info().misses
+    # "the", "cat", "and", "hat", and " "
+    assert misses == 5
+
+    assert fmcardgen.draw.wrap_font_text(font, "the cat and the hat", 100) == first
+    assert fmcardgen.draw._chunk_width.cache_info().misses == misses
+
+
+def test_render_plan(config: CardGenConfig):
+    plan = fmcardgen.draw.RenderPlan(config)
+    assert not hasattr(plan, "__dict__")
+    assert not hasattr(plan.fields[0], "__dict__")
+
+    # fonts are looked up once, when the plan is compiled
+    misses = fmcardgen.draw.font_cache_info().misses
+    for _ in range(3):
+        im = plan.draw({"title": "Hello World"})
+        assert_images_equal(im, Image.open("test_draw_expected.png"))
+    assert fmcardgen.draw.font_cache_info().misses == misses
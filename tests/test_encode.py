@@ -0,0 +1,127 @@
+import io
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from fmcardgen.config import EncodingConfig
+from fmcardgen.encode import Encoder, quantize
+
+TESTS_DIR = Path(__file__).parent
+
+
+@pytest.fixture()
+def card() -> Image.Image:
+    return Image.open(TESTS_DIR / "test_draw_expected.png").convert("RGBA")
+
+
+@pytest.mark.parametrize(
+    "dest, format",
+    [
+        ("card.png", "png"),
+        ("card.PNG", "png"),
+        ("card.webp", "webp"),
+        ("card.jpg", "jpeg"),
+        ("card.jpeg", "jpeg"),
+        ("card.avif", "avif"),
+        ("card.gif", None),
+    ],
+)
+def test_format_from_extension(dest: str, format: str):
+    assert Encoder(EncodingConfig()).format_for(dest) == format
+
+
+def test_format_overrides_extension():
+    assert Encoder(EncodingConfig(format="webp")).format_for("card.png") == "webp"
+
+
+@pytest.mark.parametrize(
+    "options", [{"format": "bmp"}, {"compress_level": 10}, {"quality": 0}]
+)
+def test_invalid_encoding_config(options):
+    with pytest.raises(ValueError):
+        EncodingConfig(**options)
+
+
+def test_default_preset_is_pillow_defaults():
+    encoder = Encoder(EncodingConfig())
+    assert encoder.options("png") == {}
+    assert encoder.options("jpeg") == {}
+    assert encoder.options(None) == {}
+
+
+def test_options_override_preset():
+    encoder = Encoder(EncodingConfig(preset="small", compress_level=3, quality=50))
+    assert encoder.options("png") == {"compress_level": 3}
+    assert encoder.options("webp")["quality"] == 50
+    assert encoder.options("webp")["method"] == 6
+
+
+@pytest.mark.parametrize("format", ["png", "webp", "jpeg", "avif"])
+@pytest.mark.parametrize("preset", ["default", "fast", "small"])
+def test_encode(card: Image.Image, format, preset):
+    encoded = Encoder(EncodingConfig(preset=preset)).encode(card, format)
+    im = Image.open(io.BytesIO(encoded))
+    assert im.format == format.upper()
+    assert im.size == card.size
+
+
+def test_png_presets_trade_speed_for_size(card: Image.Image):
+    fast = Encoder(EncodingConfig(preset="fast")).encode(card, "png")
+    small = Encoder(EncodingConfig(preset="small")).encode(card, "png")
+    assert len(small) < len(fast)
+    # lossless, whatever the preset
+    assert Image.open(io.BytesIO(fast)).tobytes() == card.tobytes()
+    assert Image.open(io.BytesIO(small)).tobytes() == card.tobytes()
+
+
+def test_save(tmp_path: Path, card: Image.Image):
+    encoder = Encoder(EncodingConfig(preset="fast"))
+    for name in ("card.png", "card.jpg", "card.gif"):
+        encoder.save(card, str(tmp_path / name))
+    assert Image.open(tmp_path / "card.png").format == "PNG"
+    assert Image.open(tmp_path / "card.jpg").format == "JPEG"
+    assert Image.open(tmp_path / "card.gif").format == "GIF"
+
+
+def test_quantize(card: Image.Image):
+    quantized = quantize(card)
+    assert quantized.mode == "P"
+    assert quantized.getcolors(256) is not None
+    # opaque cards don't need alpha in the palette
+    assert "transparency" not in quantized.info
+
+
+def test_quantize_keeps_alpha(card: Image.Image):
+    card.putpixel((0, 0), (0, 0, 0, 0))
+    quantized = quantize(card)
+    assert quantized.mode == "P"
+    assert quantized.convert("RGBA").getchannel("A").getpixel((0, 0)) == 0
+
+
+def test_quantize_exact_for_few_colours():
+    im = Image.new("RGB", (100, 100), "white")
+    im.paste((255, 0, 0), (10, 10, 50, 50))
+    quantized = quantize(im, max_colors=2, max_error=0)
+    assert quantized.mode == "P"
+    assert quantized.convert("RGB").tobytes() == im.tobytes()
+
+
+def test_quantize_falls_back_when_lossy(card: Image.Image):
+    assert quantize(card, max_colors=2, max_error=1) is card
+
+
+def test_quantize_leaves_other_modes_alone():
+    im = Image.new("L", (10, 10))
+    assert quantize(im) is im
+
+
+def test_palette_png(tmp_path: Path, card: Image.Image):
+    truecolor = Encoder(EncodingConfig()).encode(card, "png")
+    palette = Encoder(EncodingConfig(palette=True)).encode(card, "png")
+    assert Image.open(io.BytesIO(palette)).mode == "P"
+    assert len(palette) * 3 < len(truecolor)
+
+    # only PNGs are quantized
+    jpeg = Encoder(EncodingConfig(palette=True)).encode(card, "jpeg")
+    assert Image.open(io.BytesIO(jpeg)).mode == "RGB"
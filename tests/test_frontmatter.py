@@ -1,6 +1,11 @@
+import datetime
+
 import pytest
 import dateutil.parser
+import frontmatter
 from fmcardgen.frontmatter import (
+    parse_datetime,
+    read_frontmatter,
     get_frontmatter_value,
     get_frontmatter_formatted,
     get_frontmatter_list,
@@ -113,3 +118,71 @@ def test_get_frontmatter_formatted_parser():
         parsers={"date": dateutil.parser.parse},
     )
     assert value == "A Title - 2021"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "---\ntitle: A Title\ntags: [one, two]\n---\n\nbody\n---\nmore body",
+        "\n\n  ---  \ntitle: Leading Whitespace\n-----\nbody",
+        "+++\ntitle = 'TOML'\ndate = 2021-01-01\n+++\nbody",
+        '{\n"title": "JSON",\n"n": 1\n}\nbody',
+        "---\n- not\n- a dict\n---\nbody",
+        "---\ntitle: no closing delimiter\n",
+        "---\r\ntitle: Windows\r\n---\r\nbody",
+        '{\r\n"title": "Windows JSON"\r\n}\r\n',
+        "--- title: not a delimiter\n---\n",
+        "no frontmatter at all",
+        "",
+    ],
+)
+def test_read_frontmatter(tmp_path, text):
+    path = tmp_path / "post.md"
+    path.write_text(text)
+    expected, _ = frontmatter.parse(text)
+    assert read_frontmatter(path) == expected
+
+
+def test_read_frontmatter_stops_at_delimiter(tmp_path):
+    path = tmp_path / "post.md"
+    path.write_bytes(b"---\ntitle: A Title\n---\n" + b"\xff\xfe not utf-8\n" * 1000)
+    assert read_frontmatter(path) == {"title": "A Title"}
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "2021-01-01",
+        "2021-01-01T10:30",
+        "2021-01-01 10:30:15",
+        "2021-01-01T10:30:15.123",
+        "2021-01-01T10:30:15.123456",
+        "2021-01-01T10:30:15.1",
+        "2021-01-01T10:30:15Z",
+        "2021-01-01T10:30:15+05:00",
+        "January 1, 2021",
+        "1 Jan 2021 10:30",
+    ],
+)
+def test_parse_datetime_matches_dateutil(value):
+    expected = dateutil.parser.parse(value)
+    actual = parse_datetime(value)
+    assert actual == expected
+    assert actual.strftime("%c %z %Z") == expected.strftime("%c %z %Z")
+
+
+def test_parse_datetime_cached():
+    assert parse_datetime("2021-01-02") is parse_datetime("2021-01-02")
+
+
+def test_parse_datetime_not_strings():
+    dt = datetime.datetime(2021, 1, 1, 10, 30)
+    assert parse_datetime(dt) is dt
+    assert parse_datetime(datetime.date(2021, 1, 1)) == datetime.datetime(2021, 1, 1)
+    with pytest.raises(TypeError):
+        parse_datetime(2021)
+
+
+def test_parse_datetime_invalid():
+    with pytest.raises(ValueError):
+        parse_datetime("2021-02-30")
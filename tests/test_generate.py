@@ -0,0 +1,39 @@
+import pickle
+from pathlib import Path
+
+import pytest
+
+from fmcardgen.config import CardGenConfig
+from fmcardgen.dependencies import config_digest
+from fmcardgen.generate import Generator
+
+
+@pytest.fixture(autouse=True)
+def set_working_directory(monkeypatch):
+    monkeypatch.chdir(Path(__file__).parent)
+
+
+def test_generator_pickles_without_renderer(tmp_path: Path):
+    generator = Generator(CardGenConfig(), str(tmp_path / "{file_stem}.png"))
+    assert generator(Path("example.md")).error is None
+    assert generator._renderer is not None
+
+    copy = pickle.loads(pickle.dumps(generator))
+    assert copy._renderer is None
+    assert copy(Path("example.md")).error is None
+
+
+def test_unused_changes_dont_rerender(tmp_path: Path):
+    config = CardGenConfig()
+    output = str(tmp_path / "{file_stem}.png")
+    generator = Generator(config, output, config_digest(config, output))
+    post = tmp_path / "post.md"
+    post.write_text("---\ntitle: Hello\n---\nbody\n")
+    first = generator(post)
+    assert first.digest is not None and not first.unchanged
+
+    post.write_text("---\ntitle: Hello\nunused: key\n---\na different body\n")
+    assert generator(post, first.digest).unchanged
+
+    post.write_text("---\ntitle: Goodbye\n---\nbody\n")
+    assert not generator(post, first.digest).unchanged
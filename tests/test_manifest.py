@@ -0,0 +1,88 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from fmcardgen.manifest import Manifest, Stamp, stamp
+
+
+@pytest.fixture(autouse=True)
+def set_working_directory(monkeypatch):
+    monkeypatch.chdir(Path(__file__).parent)
+
+
+def stamped(path: Path) -> Stamp:
+    st = stamp(path)
+    assert st is not None
+    return st
+
+
+def test_manifest_roundtrip(tmp_path: Path):
+    post = tmp_path / "post.md"
+    post.write_text("post")
+    card = tmp_path / "card.png"
+    card.write_text("card")
+
+    manifest = Manifest(tmp_path / "manifest.json")
+    manifest.record(post, "config", "digest", str(card), stamped(post))
+    manifest.save()
+
+    manifest = Manifest.load(tmp_path / "manifest.json")
+    assert manifest.is_unchanged(post, "config")
+    assert not manifest.is_unchanged(post, "other-config")
+    assert manifest.previous_digest(post) == "digest"
+
+    st = post.stat()
+    os.utime(post, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    assert not manifest.is_unchanged(post, "config")
+    assert manifest.previous_digest(post) == "digest"
+
+    card.unlink()
+    assert manifest.previous_digest(post) is None
+
+    manifest.forget(post)
+    assert not manifest.is_unchanged(post, "config")
+    assert manifest.previous_digest(post) is None
+
+
+def test_manifest_card_changed(tmp_path: Path):
+    post = tmp_path / "post.md"
+    post.write_text("post")
+    card = tmp_path / "card.png"
+    card.write_text("card")
+    manifest = Manifest(tmp_path / "manifest.json")
+    manifest.record(post, "config", "digest", str(card), stamped(post))
+
+    # overwritten by something else
+    card.write_text("another card")
+    assert not manifest.is_unchanged(post, "config")
+    assert manifest.previous_digest(post) is None
+
+
+def test_manifest_post_edited_while_generating(tmp_path: Path):
+    post = tmp_path / "post.md"
+    post.write_text("post")
+    before = stamped(post)
+    post.write_text("edited post")
+    card = tmp_path / "card.png"
+    card.write_text("card")
+
+    manifest = Manifest(tmp_path / "manifest.json")
+    manifest.record(post, "config", "digest", str(card), before)
+    assert not manifest.is_unchanged(post, "config")
+
+
+def test_manifest_card_removed_before_recording(tmp_path: Path):
+    post = tmp_path / "post.md"
+    post.write_text("post")
+    manifest = Manifest(tmp_path / "manifest.json")
+    manifest.record(post, "config", "digest", str(tmp_path / "gone.png"), (1, 4))
+    assert manifest.entries == {}
+
+
+@pytest.mark.parametrize("contents", [None, "not json", '{"version": 0}'])
+def test_manifest_load_invalid(tmp_path: Path, contents):
+    path = tmp_path / "manifest.json"
+    if contents is not None:
+        path.write_text(contents)
+    assert Manifest.load(path).entries == {}
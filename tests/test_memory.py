@@ -0,0 +1,90 @@
+from pathlib import Path
+
+import pytest
+
+from fmcardgen import memory
+from fmcardgen.memory import (
+    MemoryBudget,
+    MemoryBudgetError,
+    MiB,
+    PROCESS_OVERHEAD,
+    WORKER_OVERHEAD,
+    card_bytes,
+    parse_size,
+)
+
+TESTS_DIR = Path(__file__).parent
+
+
+@pytest.mark.parametrize(
+    "text, size",
+    [
+        ("100000", 100000),
+        ("512M", 512 * MiB),
+        ("512MiB", 512 * MiB),
+        ("2G", 2 * 2**30),
+        ("1.5gb", 3 * 2**29),
+        (" 64 k ", 64 * 2**10),
+    ],
+)
+def test_parse_size(text: str, size: int):
+    assert parse_size(text) == size
+
+
+@pytest.mark.parametrize("text", ["", "lots", "2X", "-1G"])
+def test_parse_size_invalid(text: str):
+    with pytest.raises(ValueError, match="isn't a size"):
+        parse_size(text)
+
+
+def test_card_bytes():
+    # template.png is 1200x628
+    assert card_bytes(TESTS_DIR / "template.png") == 1200 * 628 * 4 * memory.CARD_COPIES
+
+
+def test_current_rss(monkeypatch):
+    rss = memory.current_rss()
+    assert rss is not None and rss > 10 * MiB
+
+    # without /proc, fall back to the peak
+    monkeypatch.setattr(memory, "_STATM", "/no/such/file")
+    peak = memory.current_rss()
+    assert peak is not None and peak >= rss / 2
+    monkeypatch.setattr(memory.sys, "platform", "darwin")
+    assert memory.current_rss() == peak // 1024
+
+    monkeypatch.setattr(memory, "resource", None)
+    assert memory.current_rss() is None
+
+
+CARD = 10 * MiB
+
+
+def budget(cards: int, per_card: int = 0) -> MemoryBudget:
+    return MemoryBudget(PROCESS_OVERHEAD + cards * (CARD + per_card), CARD)
+
+
+def test_budget_processes():
+    assert budget(4, WORKER_OVERHEAD).processes(8) == 4
+    assert budget(4, WORKER_OVERHEAD).processes(2) == 2
+    # not enough for two workers, so render in this process
+    assert budget(3).processes(8) == 1
+    with pytest.raises(MemoryBudgetError, match="too small: this needs at least"):
+        budget(0).processes(8)
+
+
+def test_budget_threads():
+    assert budget(3).threads(8) == 3
+    assert budget(30).threads(8) == 8
+    with pytest.raises(MemoryBudgetError):
+        budget(0).threads(8)
+
+
+def test_budget_pipeline():
+    # renderers, writers, queue size
+    assert budget(20).pipeline(1, 2, 4) == (1, 2, 4)
+    assert budget(5).pipeline(1, 2, 4) == (1, 2, 2)
+    assert budget(3).pipeline(1, 2, 4) == (1, 1, 1)
+    assert budget(4).pipeline(4, 4, 4) == (2, 1, 1)
+    with pytest.raises(MemoryBudgetError):
+        budget(2).pipeline(1, 2, 4)
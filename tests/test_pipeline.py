@@ -0,0 +1,144 @@
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import pytest
+
+from fmcardgen.config import CardGenConfig
+from fmcardgen.dependencies import config_digest
+from fmcardgen.generate import GenerateResult, Generator, PendingCard
+from fmcardgen.pipeline import Pipeline
+
+
+@pytest.fixture(autouse=True)
+def set_working_directory(monkeypatch):
+    monkeypatch.chdir(Path(__file__).parent)
+
+
+def make_posts(directory: Path, count: int) -> List[Path]:
+    posts = []
+    for i in range(count):
+        post = directory / f"post-{i}.md"
+        post.write_text(f"---\ntitle: Post number {i}\nfolder: cards\n---\n")
+        posts.append(post)
+    return posts
+
+
+@pytest.fixture()
+def output(tmp_path: Path) -> str:
+    (tmp_path / "cards").mkdir()
+    return str(tmp_path / "{folder}" / "{file_stem}.png")
+
+
+def test_pipeline_matches_serial(tmp_path: Path, output: str):
+    posts = make_posts(tmp_path, 6)
+    # one failure in each stage
+    posts[1].write_text("---\ntitle: no folder\n---\n")  # read
+    posts[3].write_text("---\nfolder: cards\n---\n")  # draw
+    posts[4].write_text("---\ntitle: x\nfolder: nope\n---\n")  # write
+
+    serial = [Generator(CardGenConfig(), output)(post) for post in posts]
+    cards = {p: p.read_bytes() for p in (tmp_path / "cards").iterdir()}
+    for card in cards:
+        card.unlink()
+
+    pipeline = Pipeline(Generator(CardGenConfig(), output), 2, 2, 2, queue_size=1)
+    results = list(pipeline.run((post, None) for post in posts))
+    # (the temporary file name in a failed write's error differs by thread)
+    assert [errors_without_details(r) for r in results] == [
+        errors_without_details(r) for r in serial
+    ]
+    assert {p: p.read_bytes() for p in (tmp_path / "cards").iterdir()} == cards
+    assert [r.error is not None for r in serial] == [0, 1, 0, 1, 1, 0]
+
+
+def errors_without_details(result: GenerateResult) -> GenerateResult:
+    return result._replace(error=result.error and result.error.split(":")[0])
+
+
+def test_pipeline_backpressure(tmp_path: Path, output: str):
+    config = CardGenConfig.model_validate({"encoding": {"preset": "fast"}})
+    generator = Generator(config, output)
+    read, write = generator.read, generator.write
+    lock = threading.Lock()
+    in_flight = [0, 0]  # current, max
+
+    def counting_read(post: Path, previous_digest: Optional[str] = None):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        return read(post, previous_digest)
+
+    def slow_write(pending: PendingCard, im):
+        time.sleep(0.01)
+        result = write(pending, im)
+        with lock:
+            in_flight[0] -= 1
+        return result
+
+    generator.read = counting_read  # type: ignore[method-assign]
+    generator.write = slow_write  # type: ignore[method-assign]
+    pipeline = Pipeline(generator, queue_size=2)
+    posts = make_posts(tmp_path, 20)
+    results = list(pipeline.run((post, None) for post in posts))
+
+    assert [r.post for r in results] == posts
+    assert all(r.error is None for r in results)
+    assert in_flight[1] <= pipeline.window < len(posts)
+
+
+def test_pipeline_overlaps_stages(tmp_path: Path, output: str):
+    # The first card can't finish writing until the third post has been read,
+    # which would never happen if the stages ran one after another
+    generator = Generator(CardGenConfig(), output)
+    posts = make_posts(tmp_path, 3)
+    read, write = generator.read, generator.write
+    third_read = threading.Event()
+    overlapped = []
+
+    def read_post(post: Path, previous_digest: Optional[str] = None):
+        if post == posts[2]:
+            third_read.set()
+        return read(post, previous_digest)
+
+    def write_card(pending: PendingCard, im):
+        if pending.post == posts[0]:
+            overlapped.append(third_read.wait(timeout=10))
+        return write(pending, im)
+
+    generator.read = read_post  # type: ignore[method-assign]
+    generator.write = write_card  # type: ignore[method-assign]
+    results = list(Pipeline(generator).run((post, None) for post in posts))
+    assert all(r.error is None for r in results)
+    assert overlapped == [True]
+
+
+def test_pipeline_profile(tmp_path: Path, output: str):
+    generator = Generator(CardGenConfig(), output, profile=True)
+    (result,) = Pipeline(generator).run([(make_posts(tmp_path, 1)[0], None)])
+    assert result.profile is not None
+    stages = {span.stage for span in result.profile.spans}
+    assert {"parse", "compile", "draw", "save"} <= stages
+
+
+def test_pipeline_jobs_error(tmp_path: Path, output: str):
+    posts = make_posts(tmp_path, 2)
+
+    def jobs() -> Iterator[Tuple[Path, Optional[str]]]:
+        yield posts[0], None
+        raise RuntimeError("walking failed")
+
+    results = Pipeline(Generator(CardGenConfig(), output)).run(jobs())
+    assert next(results).error is None
+    with pytest.raises(RuntimeError, match="walking failed"):
+        next(results)
+
+
+def test_pipeline_skips_unchanged(tmp_path: Path, output: str):
+    config = CardGenConfig()
+    generator = Generator(config, output, config_digest(config, output))
+    posts = make_posts(tmp_path, 3)
+    first = list(Pipeline(generator).run((post, None) for post in posts))
+    again = list(Pipeline(generator).run((r.post, r.digest) for r in first))
+    assert [r.unchanged for r in again] == [True, True, True]
@@ -0,0 +1,154 @@
+import io
+import json
+from pathlib import Path
+from typing import Dict
+
+import pytest
+from rich.console import Console
+from typer.testing import CliRunner
+
+from fmcardgen.cli import cli
+from fmcardgen.config import CardGenConfig
+from fmcardgen.generate import Generator
+from fmcardgen.profile import Profile, ProfileReport, Span, profiling, stage
+
+TESTS_DIR = Path(__file__).parent
+
+
+def test_stage_is_a_no_op_unless_profiling():
+    with stage("nothing"):
+        pass
+    with profiling() as profile:
+        pass
+    assert profile.spans == []
+
+
+def test_nested_stages():
+    with profiling() as profile:
+        with stage("outer"):
+            with stage("inner"):
+                pass
+            with stage("inner"):
+                pass
+    assert [s.stage for s in profile.spans] == ["outer/inner", "outer/inner", "outer"]
+    outer = profile.spans[-1]
+    assert all(s.start >= outer.start for s in profile.spans)
+    assert all(s.duration <= outer.duration for s in profile.spans)
+
+
+def test_generator_profile(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(TESTS_DIR)
+    config = CardGenConfig.from_file(Path("config.yml"))
+    generator = Generator(config, str(tmp_path / "{file_stem}.png"), profile=True)
+    result = generator(TESTS_DIR / "example.md")
+    assert result.error is None
+    assert result.profile is not None
+    assert all(s.rss for s in result.profile.spans)
+    stages = {s.stage for s in result.profile.spans}
+    assert {
+        "parse",
+        "compile",
+        "draw",
+        "draw/template",
+        "draw/text field",
+        "draw/text field/wrap",
+        "draw/text field/text",
+        "save",
+    } <= stages
+
+    # no profile unless asked for
+    generator.profile = False
+    assert generator(TESTS_DIR / "example.md").profile is None
+
+
+def report(timings: bool = True, trace: bool = True) -> ProfileReport:
+    report = ProfileReport(timings=timings, trace=trace)
+    report.add(
+        Path("fast.md"),
+        Profile(1, 2, [Span("draw/wrap", 1.0, 0.001), Span("draw", 1.0, 0.002)]),
+    )
+    report.add(
+        Path("slow.md"), Profile(1, 2, [Span("draw", 2.0, 0.5, rss=300 * 2**20)])
+    )
+    return report
+
+
+def test_report_print():
+    out = io.StringIO()
+    report().print(Console(file=out, width=200), slowest=1)
+    text = out.getvalue()
+    assert "draw " in text and "  wrap " in text
+    assert "slow.md" in text and "500.0" in text
+    assert "fast.md" not in text
+    # peak RSS, where there is one
+    assert rows(text) == {"draw": "300", "wrap": "-"}
+
+
+def test_report_print_memory():
+    out = io.StringIO()
+    report(timings=False, trace=False).print_memory(Console(file=out, width=200))
+    text = out.getvalue()
+    assert "Peak RSS" in text and "Slowest" not in text
+    assert rows(text) == {"draw": "300"}
+
+
+def test_report_keeps_only_what_is_asked_for():
+    memory_only = report(timings=False, trace=False)
+    assert memory_only.rss == {"draw": 300 * 2**20}
+    assert not memory_only.stages and not memory_only.posts
+    assert not memory_only.profiles
+
+    timings = report(trace=False)
+    assert len(timings.stages["draw"]) == 2 and len(timings.posts) == 2
+    assert not timings.profiles
+
+
+def rows(table: str) -> Dict[str, str]:
+    # each stage's name and the last column, for the first table printed
+    cells = (line.strip("│ ").split("│") for line in table.split("└")[0].splitlines())
+    return {
+        c[0].strip(): c[-1].strip()
+        for c in cells
+        if len(c) > 1 and c[0].strip() != "stage"
+    }
+
+
+def test_report_chrome_trace(tmp_path: Path):
+    report().write_chrome_trace(tmp_path / "trace.json")
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert len(events) == 3
+    assert events[0]["name"] == "wrap" and "args" not in events[0]
+    assert events[1] == {
+        "name": "draw",
+        "cat": "draw",
+        "ph": "X",
+        "ts": 1e6,
+        "dur": 2000.0,
+        "pid": 1,
+        "tid": 2,
+        "args": {"post": "fast.md"},
+    }
+
+
+@pytest.mark.parametrize("trace", [False, True])
+def test_cli_profile(tmp_path: Path, monkeypatch, trace: bool):
+    monkeypatch.chdir(TESTS_DIR)
+    trace_path = tmp_path / "trace.json"
+    options = ["--trace", str(trace_path)] if trace else ["--profile"]
+    result = CliRunner().invoke(
+        cli,
+        [
+            "--config",
+            "config.yml",
+            "--output",
+            str(tmp_path / "{file_stem}.png"),
+            "--jobs",
+            "1",
+            *options,
+            "example.md",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert "per stage" in result.output
+    assert "Slowest" in result.output
+    assert trace_path.exists() == trace
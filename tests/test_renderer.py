@@ -0,0 +1,69 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+import fmcardgen
+from fmcardgen.config import CardGenConfig
+from fmcardgen.draw import draw
+from fmcardgen.renderer import CardRenderer
+
+
+@pytest.fixture(autouse=True)
+def set_working_directory(monkeypatch):
+    monkeypatch.chdir(Path(__file__).parent)
+
+
+@pytest.fixture()
+def renderer() -> CardRenderer:
+    return CardRenderer(CardGenConfig.from_file(Path("config.yml")))
+
+
+FM = {"title": "Hello World", "author": "Jacob", "date": "2020-01-02", "tags": ["a"]}
+
+
+def test_render(renderer: CardRenderer):
+    im = renderer.render(FM)
+    assert im.tobytes() == draw(FM, renderer.config).tobytes()
+
+
+def test_render_bytes(renderer: CardRenderer):
+    card = Image.open(io.BytesIO(renderer.render_bytes(FM)))
+    assert card.format == "PNG"
+    assert card.tobytes() == renderer.render(FM).tobytes()
+
+    card = Image.open(io.BytesIO(renderer.render_bytes(FM, format="webp")))
+    assert card.format == "WEBP"
+
+
+def test_render_bytes_config_format():
+    config = CardGenConfig.from_file(Path("config.yml"))
+    config.encoding.format = "jpeg"
+    renderer = CardRenderer(config)
+    assert Image.open(io.BytesIO(renderer.render_bytes(FM))).format == "JPEG"
+
+
+def test_render_bytes_unknown_format(renderer: CardRenderer):
+    with pytest.raises(ValueError, match="must be one of: png, webp, jpeg, avif"):
+        renderer.render_bytes(FM, format="bmp")  # type: ignore[arg-type]
+
+
+def test_save(renderer: CardRenderer, tmp_path: Path):
+    renderer.save(FM, tmp_path / "card.webp")
+    assert Image.open(tmp_path / "card.webp").format == "WEBP"
+
+
+def test_render_in_threads(renderer: CardRenderer):
+    posts = [dict(FM, title=f"Post number {i} " * (i % 4 + 1)) for i in range(32)]
+    expected = [renderer.render_bytes(fm) for fm in posts]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert list(executor.map(renderer.render_bytes, posts)) == expected
+
+
+def test_lazy_exports():
+    assert fmcardgen.CardRenderer is CardRenderer
+    assert fmcardgen.CardGenConfig is CardGenConfig
+    with pytest.raises(AttributeError, match="has no attribute 'nope'"):
+        fmcardgen.nope  # type: ignore[attr-defined]
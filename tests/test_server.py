@@ -0,0 +1,223 @@
+import io
+import json
+import shutil
+import threading
+from contextlib import contextmanager
+from http.client import HTTPConnection
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+
+from fmcardgen.cli import cli
+from fmcardgen.config import CardGenConfig
+from fmcardgen.draw import draw
+from fmcardgen.frontmatter import read_frontmatter
+from fmcardgen.server import CardCache, CardServer
+
+TESTS_DIR = Path(__file__).parent
+
+
+@contextmanager
+def serving(root: Path) -> Iterator[CardServer]:
+    config = CardGenConfig.from_file(root / "config.yml")
+    server = CardServer(("127.0.0.1", 0), config, root, cache_size=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@pytest.fixture()
+def server(monkeypatch) -> Iterator[CardServer]:
+    monkeypatch.chdir(TESTS_DIR)
+    with serving(TESTS_DIR) as server:
+        yield server
+
+
+def request(
+    server: CardServer,
+    path: str,
+    body: Optional[bytes] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Tuple[int, Dict[str, str], bytes]:
+    req = Request(server.url + path, data=body, headers=headers or {})
+    try:
+        with urlopen(req) as resp:
+            return resp.status, dict(resp.headers), resp.read()
+    except HTTPError as e:
+        return e.code, dict(e.headers), e.read()
+
+
+def test_serve_post(server: CardServer):
+    status, headers, body = request(server, "/card?post=example.md")
+    assert status == 200
+    assert headers["Content-Type"] == "image/png"
+    assert headers["ETag"]
+
+    expected = draw(read_frontmatter(TESTS_DIR / "example.md"), server.config)
+    assert Image.open(io.BytesIO(body)).tobytes() == expected.tobytes()
+
+
+def test_serve_posted_frontmatter(server: CardServer):
+    fm = read_frontmatter(TESTS_DIR / "example.md")
+    status, headers, body = request(server, "/card", json.dumps(fm).encode())
+    assert status == 200
+
+    # same inputs, same card
+    _, get_headers, get_body = request(server, "/card?post=example.md")
+    assert headers["ETag"] == get_headers["ETag"]
+    assert body == get_body
+
+
+def test_serve_caches_cards(server: CardServer, monkeypatch):
+    calls = []
+    render = server.render
+
+    def counting_render(fm):
+        calls.append(fm)
+        return render(fm)
+
+    monkeypatch.setattr(server, "render", counting_render)
+    first = request(server, "/card", b'{"title": "cached"}')
+    second = request(server, "/card", b'{"title": "cached"}')
+    assert first[2] == second[2]
+    assert len(calls) == 1
+
+
+def test_serve_not_modified(server: CardServer):
+    _, headers, _ = request(server, "/card", b'{"title": "etag"}')
+    status, _, body = request(
+        server,
+        "/card",
+        b'{"title": "etag"}',
+        headers={"If-None-Match": headers["ETag"]},
+    )
+    assert status == 304
+    assert body == b""
+
+
+def test_serve_irrelevant_keys_share_cards(server: CardServer):
+    _, a, _ = request(server, "/card", b'{"title": "x", "author": "a"}')
+    _, b, _ = request(server, "/card", b'{"title": "x", "author": "b"}')
+    _, c, _ = request(server, "/card", b'{"title": "y"}')
+    assert a["ETag"] == b["ETag"] != c["ETag"]
+
+
+@pytest.mark.parametrize(
+    "path, body, status",
+    [
+        ("/nope", None, 404),
+        ("/nope", b"{}", 404),
+        ("/card", None, 400),
+        ("/card?post=missing.md", None, 404),
+        ("/card?post=../README.md", None, 404),
+        ("/card", b"not json", 400),
+        ("/card", b"[1, 2]", 400),
+        ("/card", b'{"no_title": 1}', 422),
+    ],
+)
+def test_serve_errors(server: CardServer, path: str, body: bytes, status: int):
+    assert request(server, path, body)[0] == status
+
+
+def test_serve_unreadable_post(server: CardServer, tmp_path: Path):
+    (tmp_path / "bad.md").write_text("---\ntitle: [unclosed\n---\n")
+    server.root = tmp_path.resolve()
+    status, _, body = request(server, "/card?post=bad.md")
+    assert status == 422
+    assert b"ParserError" in body
+
+
+def test_serve_render_error_spans_lines(server: CardServer, monkeypatch):
+    def fail(fm):
+        raise ValueError("first line\nsecond line")
+
+    monkeypatch.setattr(server, "render", fail)
+    status, _, body = request(server, "/card", b'{"title": "x"}')
+    assert status == 422
+    assert b"ValueError: first line\nsecond line" in body
+
+
+@pytest.mark.parametrize("length", ["nope", "-1"])
+def test_serve_invalid_content_length(server: CardServer, length: str):
+    conn = HTTPConnection(urlsplit(server.url).netloc)
+    conn.putrequest("POST", "/card")
+    conn.putheader("Content-Length", length)
+    conn.endheaders()
+    assert conn.getresponse().status == 400
+    conn.close()
+
+
+def test_serve_template_changes(tmp_path: Path, monkeypatch):
+    shutil.copy(TESTS_DIR / "config.yml", tmp_path)
+    shutil.copy(TESTS_DIR / "template.png", tmp_path)
+    shutil.copytree(TESTS_DIR / "RobotoCondensed", tmp_path / "RobotoCondensed")
+    monkeypatch.chdir(tmp_path)
+    template = tmp_path / "template.png"
+
+    with serving(tmp_path) as server:
+        _, headers, before = request(server, "/card", b'{"title": "x"}')
+
+        # half-written: the old template is still used
+        template.write_bytes(template.read_bytes()[:100])
+        status, still, body = request(server, "/card", b'{"title": "x"}')
+        assert status == 200
+        assert still["ETag"] == headers["ETag"] and body == before
+
+        Image.new("RGB", (1200, 628), "red").save(template)
+        status, after, body = request(
+            server, "/card", b'{"title": "x"}', {"If-None-Match": headers["ETag"]}
+        )
+        assert status == 200
+        assert after["ETag"] != headers["ETag"] and body != before
+        assert Image.open(io.BytesIO(body)).convert("RGB").getpixel((0, 0)) == (
+            255,
+            0,
+            0,
+        )
+
+
+def test_serve_busy(server: CardServer):
+    server.queue_timeout = 0.01
+    for _ in range(4):
+        server.render_slots.acquire()
+    try:
+        assert request(server, "/card", b'{"title": "busy"}')[0] == 503
+    finally:
+        for _ in range(4):
+            server.render_slots.release()
+
+
+def test_card_cache_evicts_least_recently_used():
+    cache = CardCache(2)
+    cache.put("a", b"a")
+    cache.put("b", b"b")
+    assert cache.get("a") == b"a"
+    cache.put("c", b"c")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"a"
+    assert cache.get("c") == b"c"
+
+
+def test_cli_serve(monkeypatch):
+    monkeypatch.chdir(TESTS_DIR)
+
+    def serve_forever(self):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(CardServer, "serve_forever", serve_forever)
+    result = CliRunner().invoke(
+        cli, ["serve", "--config", "config.yml", "--port", "0", "."]
+    )
+    assert result.exit_code == 0, result.output
+    assert "serving cards on http://127.0.0.1:" in result.output
@@ -0,0 +1,157 @@
+import os
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from fmcardgen.cli import cli
+from fmcardgen.config import CardGenConfig
+from fmcardgen.generate import Generator
+from fmcardgen.store import CardStore, link_or_copy, replacing
+
+TESTS_DIR = Path(__file__).parent
+
+
+@pytest.fixture()
+def posts(tmp_path: Path, monkeypatch) -> Path:
+    """
+    Three posts, two of which have the same title (and so, the same card)
+    """
+    monkeypatch.chdir(TESTS_DIR)
+    posts = tmp_path / "posts"
+    posts.mkdir()
+    (posts / "hello.md").write_text("---\ntitle: Hello\nlang: en\n---\n")
+    (posts / "hello-fr.md").write_text("---\ntitle: Hello\nlang: fr\n---\nBonjour\n")
+    (posts / "goodbye.md").write_text("---\ntitle: Goodbye\n---\n")
+    return posts
+
+
+def generator(tmp_path: Path, store: CardStore) -> Generator:
+    config = CardGenConfig.from_file(TESTS_DIR / "config.yml")
+    return Generator(config, str(tmp_path / "cards-{file_stem}.png"), store=store)
+
+
+def test_identical_cards_are_reused(tmp_path: Path, posts: Path):
+    gen = generator(tmp_path, CardStore())
+    hello = gen(posts / "hello.md")
+    hello_fr = gen(posts / "hello-fr.md")
+    goodbye = gen(posts / "goodbye.md")
+
+    assert not hello.reused
+    assert hello_fr.reused
+    assert not goodbye.reused
+
+    assert hello.dest is not None and hello_fr.dest is not None
+    assert Path(hello_fr.dest).read_bytes() == Path(hello.dest).read_bytes()
+    assert os.path.samefile(hello.dest, hello_fr.dest)
+
+
+def test_rendering_is_deterministic(tmp_path: Path, posts: Path):
+    # so that reusing a card gives exactly what drawing it would have
+    gen = generator(tmp_path, CardStore())
+    gen.store = None
+    hello = gen(posts / "hello.md")
+    hello_fr = gen(posts / "hello-fr.md")
+    assert hello.dest is not None and hello_fr.dest is not None
+    assert Path(hello_fr.dest).read_bytes() == Path(hello.dest).read_bytes()
+
+
+def test_persistent_store(tmp_path: Path, posts: Path):
+    store = tmp_path / "store"
+    first = generator(tmp_path / "one", CardStore(store))
+    (tmp_path / "one").mkdir()
+    assert not first(posts / "hello.md").reused
+    assert len(list(store.iterdir())) == 1
+
+    # a new run (with an empty in-memory store) reuses the stored card
+    second = generator(tmp_path / "two", CardStore(store))
+    (tmp_path / "two").mkdir()
+    assert second(posts / "hello.md").reused
+    assert not second(posts / "goodbye.md").reused
+    assert len(list(store.iterdir())) == 2
+
+
+def test_regenerating_in_place(tmp_path: Path, posts: Path):
+    gen = generator(tmp_path, CardStore())
+    assert not gen(posts / "hello.md").reused
+    # the card is already where it should be
+    assert gen(posts / "hello.md").reused
+
+
+def test_missing_cards_arent_reused(tmp_path: Path, posts: Path):
+    gen = generator(tmp_path, CardStore())
+    dest = gen(posts / "hello.md").dest
+    assert dest is not None
+    os.remove(dest)
+    assert not gen(posts / "hello-fr.md").reused
+
+
+def test_format_is_part_of_the_key(tmp_path: Path):
+    store = CardStore(tmp_path / "store")
+    card = tmp_path / "card.png"
+    card.write_bytes(b"png")
+    store.put("abc", str(card))
+    store.put("abc", str(card))
+    assert [p.name for p in (tmp_path / "store").iterdir()] == ["abc.png"]
+    assert store.get("abc", str(tmp_path / "other.png"))
+    assert not store.get("abc", str(tmp_path / "other.webp"))
+    assert not store.get("def", str(tmp_path / "other.png"))
+
+
+def test_get_skips_sources_that_cant_be_copied(tmp_path: Path):
+    store = CardStore(tmp_path / "store")
+    card = tmp_path / "card.png"
+    card.write_bytes(b"png")
+    store.put("abc", str(card))
+    # the in-memory source is copied into a directory that doesn't exist...
+    assert not store.get("abc", str(tmp_path / "nope" / "card.png"))
+
+
+def test_link_or_copy_falls_back_to_copying(tmp_path: Path, monkeypatch):
+    def no_links(source, dest):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr(os, "link", no_links)
+    (tmp_path / "a").write_text("a")
+    link_or_copy(str(tmp_path / "a"), str(tmp_path / "b"))
+    assert (tmp_path / "b").read_text() == "a"
+    assert not os.path.samefile(tmp_path / "a", tmp_path / "b")
+
+
+def test_replacing_doesnt_write_through_links(tmp_path: Path):
+    (tmp_path / "a").write_text("a")
+    link_or_copy(str(tmp_path / "a"), str(tmp_path / "b"))
+    with replacing(str(tmp_path / "b")) as tmp:
+        Path(tmp).write_text("b")
+    assert (tmp_path / "a").read_text() == "a"
+    assert (tmp_path / "b").read_text() == "b"
+
+
+def test_replacing_cleans_up_after_errors(tmp_path: Path):
+    with pytest.raises(RuntimeError):
+        with replacing(str(tmp_path / "card.png")) as tmp:
+            Path(tmp).write_text("half a card")
+            raise RuntimeError()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cli_store(tmp_path: Path, posts: Path):
+    args = [
+        "--config",
+        "config.yml",
+        "--output",
+        str(tmp_path / "{file_stem}.png"),
+        "--recursive",
+        "--jobs",
+        "1",
+        "--store",
+        str(tmp_path / "store"),
+        str(posts),
+    ]
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+    assert "1 cards copied from identical cards" in result.output
+
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+    assert "3 cards copied from identical cards" in result.output
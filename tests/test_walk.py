@@ -0,0 +1,141 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from fmcardgen.walk import IgnoreRule, is_ignored, walk_posts
+
+
+def make_tree(root: Path, files):
+    for f in files:
+        path = root / f
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+
+
+def walked(root: Path, **kwargs):
+    return [p.relative_to(root).as_posix() for p in walk_posts(root, **kwargs)]
+
+
+def test_walk_posts(tmp_path: Path):
+    make_tree(
+        tmp_path,
+        [
+            "b.md",
+            "a.rst",
+            "notes.txt",
+            "image.png",
+            "sub/c.md",
+            "sub/deeper/d.md",
+            ".git/objects/e.md",
+            "node_modules/pkg/README.md",
+        ],
+    )
+    assert walked(tmp_path, ext=["md", "rst"]) == [
+        "a.rst",
+        "b.md",
+        "sub/c.md",
+        "sub/deeper/d.md",
+    ]
+
+
+def test_walk_posts_is_lazy(tmp_path: Path):
+    make_tree(tmp_path, ["a.md", "sub/b.md"])
+    posts = walk_posts(tmp_path, ext=["md"])
+    assert next(posts) == tmp_path / "a.md"
+    # the subdirectory hasn't been looked at yet, so changes still show up
+    (tmp_path / "sub" / "c.md").write_text("")
+    assert list(posts) == [tmp_path / "sub" / "b.md", tmp_path / "sub" / "c.md"]
+
+
+def test_walk_posts_ignore(tmp_path: Path):
+    make_tree(tmp_path, ["a.md", "drafts/b.md", "public/c.md", "sub/public/d.md"])
+    assert walked(tmp_path, ext=["md"], ignore=["drafts/", "/public"]) == [
+        "a.md",
+        "sub/public/d.md",
+    ]
+    assert walked(tmp_path, ext=["md"], ignore=["public", "a.*"]) == ["drafts/b.md"]
+
+
+def test_walk_posts_gitignore(tmp_path: Path):
+    make_tree(
+        tmp_path,
+        [
+            "a.md",
+            "draft-a.md",
+            "public/b.md",
+            "sub/draft-c.md",
+            "sub/draft-keep.md",
+            "sub/e.md",
+            "sub/private/f.md",
+            "other/private/g.md",
+        ],
+    )
+    (tmp_path / ".gitignore").write_text("# output\n/public/\ndraft-*\n")
+    (tmp_path / "sub" / ".gitignore").write_text("!draft-keep.md\nprivate/\n")
+
+    assert walked(tmp_path, ext=["md"]) == [
+        "a.md",
+        "other/private/g.md",
+        "sub/draft-keep.md",
+        "sub/e.md",
+    ]
+    assert len(walked(tmp_path, ext=["md"], gitignore=False)) == 8
+
+
+def test_walk_posts_doesnt_follow_symlinks(tmp_path: Path):
+    make_tree(tmp_path, ["real/a.md"])
+    os.symlink(tmp_path / "real", tmp_path / "link")
+    os.symlink(tmp_path, tmp_path / "real" / "loop")
+    assert walked(tmp_path, ext=["md"]) == ["real/a.md"]
+
+
+def test_walk_posts_unreadable_directory(tmp_path: Path, monkeypatch):
+    make_tree(tmp_path, ["a.md", "sub/b.md"])
+    real_scandir = os.scandir
+
+    def scandir(path):
+        if path.endswith("sub"):
+            raise PermissionError(path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", scandir)
+    assert walked(tmp_path, ext=["md"]) == ["a.md"]
+
+
+@pytest.mark.parametrize(
+    "line, path, is_dir, expected",
+    [
+        ("*.md", "a/b/c.md", False, True),
+        ("build/", "a/build", True, True),
+        ("build/", "a/build", False, False),
+        ("/build", "a/build", True, False),
+        ("a/build", "a/build", True, True),
+        ("docs/*.md", "docs/x.md", False, True),
+        ("docs/*.md", "other/docs/x.md", False, False),
+        ("drafts/*.md", "drafts/sub/x.md", False, False),
+        ("**/build", "build", True, True),
+        ("**/build", "a/b/build", True, True),
+        ("doc/**/*.md", "doc/a.md", False, True),
+        ("doc/**/*.md", "doc/a/b/c.md", False, True),
+        ("doc/**/*.md", "other/doc/a.md", False, False),
+        ("doc/**", "doc/a/b.md", False, True),
+        ("doc/**", "doc", True, False),
+    ],
+)
+def test_ignore_rule(line, path, is_dir, expected):
+    rule = IgnoreRule.parse(line)
+    assert rule.matches(path, path.rsplit("/", 1)[-1], is_dir) == expected
+
+
+def test_ignore_rule_with_base():
+    rule = IgnoreRule.parse("/x", base="sub")
+    assert rule.matches("sub/x", "x", False)
+    assert not rule.matches("x", "x", False)
+    assert not rule.matches("other/sub/x", "x", False)
+
+
+def test_is_ignored_last_rule_wins():
+    rules = [IgnoreRule.parse("*.md"), IgnoreRule.parse("!keep.md")]
+    assert is_ignored(rules, "a.md", "a.md", False)
+    assert not is_ignored(rules, "keep.md", "keep.md", False)
@@ -0,0 +1,199 @@
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import List
+
+import pytest
+from typer.testing import CliRunner
+
+import fmcardgen.generate
+import fmcardgen.watch
+from fmcardgen.cli import cli
+from fmcardgen.generate import GenerateResult
+from fmcardgen.watch import Watcher
+
+TESTS_DIR = Path(__file__).parent
+
+
+@pytest.fixture()
+def site(tmp_path: Path, monkeypatch) -> Path:
+    """
+    A copy of the test config, template and fonts, plus a couple of posts
+    """
+    monkeypatch.chdir(tmp_path)
+    shutil.copy(TESTS_DIR / "config.yml", tmp_path)
+    shutil.copy(TESTS_DIR / "template.png", tmp_path)
+    shutil.copytree(TESTS_DIR / "RobotoCondensed", tmp_path / "RobotoCondensed")
+    (tmp_path / "posts").mkdir()
+    write(tmp_path / "posts" / "one.md", "---\ntitle: One\n---\n")
+    write(tmp_path / "posts" / "two.md", "---\ntitle: Two\n---\n")
+    return tmp_path
+
+
+def write(path: Path, text: str) -> None:
+    """
+    Write a file, making sure its mtime changes even if the filesystem's
+    timestamps are coarse.
+    """
+    old_mtime = path.stat().st_mtime_ns if path.exists() else 0
+    path.write_text(text)
+    mtime = max(path.stat().st_mtime_ns, old_mtime + 1_000_000)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def touch(path: Path) -> None:
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def watcher(site: Path) -> Watcher:
+    return Watcher([site / "posts"], site / "config.yml")
+
+
+def rendered(results):
+    assert all(r.error is None for r in results), results
+    return sorted(r.post.name for r in results)
+
+
+def test_watch_nothing_changed(site: Path):
+    w = watcher(site)
+    assert w.poll() == []
+    # cards aren't generated for existing posts
+    assert not (site / "card-one.png").exists()
+
+
+def test_watch_post_changes(site: Path):
+    w = watcher(site)
+
+    write(site / "posts" / "one.md", "---\ntitle: One, edited\n---\n")
+    assert rendered(w.poll()) == ["one.md"]
+    assert (site / "card-one.png").is_file()
+    assert not (site / "card-two.png").exists()
+    assert w.poll() == []
+
+    write(site / "posts" / "three.md", "---\ntitle: Three\n---\n")
+    (site / "posts" / "two.md").unlink()
+    assert rendered(w.poll()) == ["three.md"]
+
+
+def test_watch_only_walks_when_a_directory_changes(site: Path, monkeypatch):
+    walks = []
+
+    def find_posts(*args):
+        walks.append(1)
+        return fmcardgen.generate.find_posts(*args)
+
+    monkeypatch.setattr(fmcardgen.watch, "find_posts", find_posts)
+    (site / "posts" / "sub").mkdir()
+    w = watcher(site)
+    assert len(walks) == 1
+
+    # editing a post only needs the posts already found to be checked
+    assert w.poll() == []
+    write(site / "posts" / "one.md", "---\ntitle: One, edited\n---\n")
+    assert rendered(w.poll()) == ["one.md"]
+    assert len(walks) == 1
+
+    # a new post, in a directory that had none, changes that directory
+    write(site / "posts" / "sub" / "three.md", "---\ntitle: Three\n---\n")
+    touch(site / "posts" / "sub")
+    assert rendered(w.poll()) == ["three.md"]
+    assert len(walks) == 2
+
+    # and every so often, everything is walked again anyway
+    monkeypatch.setattr(fmcardgen.watch, "REWALK_INTERVAL", 0.0)
+    assert w.poll() == []
+    assert len(walks) == 3
+
+
+def test_watch_config_changes(site: Path):
+    w = watcher(site)
+    config = (site / "config.yml").read_text()
+
+    write(site / "config.yml", config.replace("card-{file_stem}", "new-{file_stem}"))
+    assert rendered(w.poll()) == ["one.md", "two.md"]
+    assert (site / "new-one.png").is_file()
+    assert (site / "new-two.png").is_file()
+
+
+def test_watch_invalid_config(site: Path):
+    w = watcher(site)
+    config = (site / "config.yml").read_text()
+
+    write(site / "config.yml", config.replace("x: 123", "x: [oops"))
+    [result] = w.poll()
+    assert result.post == site / "config.yml"
+    assert result.error is not None
+
+    # the old config is still used...
+    write(site / "posts" / "one.md", "---\ntitle: One, edited\n---\n")
+    assert rendered(w.poll()) == ["one.md"]
+    assert (site / "card-one.png").is_file()
+
+    # ... until it's fixed
+    write(site / "config.yml", config.replace("card-{file_stem}", "new-{file_stem}"))
+    assert rendered(w.poll()) == ["one.md", "two.md"]
+    assert (site / "new-one.png").is_file()
+
+
+def test_watch_template_and_font_changes(site: Path, monkeypatch):
+    cleared = []
+    monkeypatch.setattr(fmcardgen.watch, "clear_font_caches", lambda: cleared.append(1))
+    w = watcher(site)
+
+    touch(site / "template.png")
+    assert rendered(w.poll()) == ["one.md", "two.md"]
+    assert len(cleared) == 1
+
+    touch(site / "RobotoCondensed" / "RobotoCondensed-Bold.ttf")
+    assert rendered(w.poll()) == ["one.md", "two.md"]
+    assert len(cleared) == 2
+
+
+def test_watch_default_config(site: Path):
+    w = Watcher([site / "posts" / "one.md"], output=str(site / "{file_stem}.png"))
+    write(site / "posts" / "one.md", "---\ntitle: One, edited\n---\n")
+    assert rendered(w.poll()) == ["one.md"]
+    assert (site / "one.png").is_file()
+
+    (site / "posts" / "one.md").unlink()
+    assert w.poll() == []
+
+
+def test_watch_run(site: Path, monkeypatch):
+    def sleep(interval):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(time, "sleep", sleep)
+    w = watcher(site)
+    write(site / "posts" / "one.md", "---\ntitle: One, edited\n---\n")
+
+    results: List[GenerateResult] = []
+    with pytest.raises(KeyboardInterrupt):
+        w.run(results.append)
+    assert rendered(results) == ["one.md"]
+
+
+def test_cli_watch(site: Path, monkeypatch):
+    def run(self, report, interval):
+        write(site / "posts" / "one.md", "---\ntitle: One, edited\n---\n")
+        write(site / "posts" / "two.md", "no frontmatter")
+        for result in self.poll():
+            report(result)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(Watcher, "run", run)
+    runner = CliRunner()
+    result = runner.invoke(
+        cli, ["watch", "--config", "config.yml", "--recursive", "posts"]
+    )
+    assert result.exit_code == 0
+    assert "card-one.png" in result.output
+    assert "KeyError: 'title'" in result.output
+
+
+def test_cli_watch_requires_recursive(site: Path):
+    runner = CliRunner()
+    result = runner.invoke(cli, ["watch", "posts"])
+    assert result.exit_code == 1